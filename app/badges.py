@@ -0,0 +1,375 @@
+"""
+Badge and portfolio bodies, shared by the REST endpoints and /api/stream.
+
+Two implementations produce identical JSON: the per-coin Decimal code
+(`badge_row`, `portfolio_decimal`), kept as the reference, and a vectorized
+one over exact fixed-point NumPy columns (app/fixedpoint.py) that is used
+when `monitor.vector_math` is on. Coins the vectorized path can't represent
+exactly are redone with the reference code.
+
+    CONFIG_PATH=.env/config.json python -m app.badges   # parity check on random inputs
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import get_config
+from .snapshot import snapshot, SnapshotCache
+from . import crud
+from . import fixedpoint as fx
+
+def D(x) -> Decimal:
+    return Decimal(str(x))
+
+@dataclass
+class BadgeInputs:
+    """Per-coin inputs of the badge math, one list entry per coin."""
+    coins: List[str]
+    amount: List[Decimal]
+    price: List[Optional[Decimal]]
+    window: List[Optional[Decimal]]      # price at the start of the lookback window
+    dca: List[Optional[Decimal]]
+    initial: List[Optional[Decimal]]
+    last_sell: List[Optional[Decimal]]
+    sell_pct: List[Decimal]
+    buy_pct: List[Decimal]
+    rebuy_disc: List[Decimal]
+    profit: List[Decimal]
+
+def gather_inputs(cfg, snap, coins: List[str], window_map: Dict[str, Optional[Decimal]]) -> BadgeInputs:
+    held = snap.ledger["positions"]
+    dca = [held.get(c, {}).get("dca") for c in coins]
+    last_sell = [held.get(c, {}).get("last_sell_price") for c in coins]
+    return BadgeInputs(
+        coins=coins,
+        amount=[snap.balances.get(c, D("0")) for c in coins],
+        price=[snap.prices.get(c) for c in coins],
+        window=[D(window_map[c]) if window_map.get(c) is not None else None for c in coins],
+        dca=[D(v) if v is not None else None for v in dca],
+        initial=[snap.initial.get(c) for c in coins],
+        last_sell=[D(v) if v is not None else None for v in last_sell],
+        sell_pct=[D(cfg.coins[c].sell_percentage) if c in cfg.coins else D(cfg.sell_percentage) for c in coins],
+        buy_pct=[D(cfg.coins[c].buy_percentage) if c in cfg.coins else D(cfg.buy_percentage) for c in coins],
+        rebuy_disc=[D(cfg.coins[c].rebuy_discount) if c in cfg.coins else D("0") for c in coins],
+        profit=[snap.profit.get(c, D("0")) for c in coins],
+    )
+
+def badge_row(inp: BadgeInputs, i: int) -> dict:
+    """Reference Decimal computation of one coin's badge."""
+    coin = inp.coins[i]
+    amount = inp.amount[i]
+    price_now = inp.price[i]
+    price_ref_window = inp.window[i]
+
+    # portfolio value & eligibility FIRST (so we can use `eligible` below)
+    position_usdc = (amount * price_now) if (price_now is not None) else None
+    eligible = (position_usdc is not None and position_usdc >= D("1"))
+
+    # DCA & INITIAL
+    dca_avg_D = inp.dca[i]
+    init_price = inp.initial[i]  # from trading_state fetched earlier
+
+    sell_pct = inp.sell_pct[i]
+    buy_pct = inp.buy_pct[i]
+    rebuy_disc = inp.rebuy_disc[i]
+
+    # STRICT reference: held -> DCA only; unheld -> INITIAL only
+    if eligible:
+        ref_price = dca_avg_D
+        ref_kind = "DCA" if dca_avg_D is not None else None
+    else:
+        ref_price = init_price
+        ref_kind = "INITIAL" if init_price is not None else None
+
+    current_pct_from_ref = None
+    if price_now is not None and ref_price not in (None, D("0")):
+        current_pct_from_ref = ((price_now / ref_price) - D("1")) * D("100")
+
+    # SELL target: only when holding AND we have DCA
+    sell_target = (dca_avg_D * (D("1") + sell_pct / D("100"))) if (eligible and dca_avg_D is not None) else None
+
+    # BUY target: only when NOT holding; base on INITIAL (fallback to current price)
+    base_for_buy = init_price if (not eligible) else None
+    if base_for_buy is None and not eligible:
+        base_for_buy = price_now
+    buy_target = (base_for_buy * (D("1") + buy_pct / D("100"))) if base_for_buy is not None else None
+
+    # Rebuy level:
+    #  - If HOLDING: dip-add below DCA
+    #  - If NOT holding: re-enter below LAST SELL (if it exists)
+    last_sell_price = inp.last_sell[i]  # None if never sold
+    base_for_rebuy = dca_avg_D if eligible else last_sell_price
+    rebuy_level = (
+        base_for_rebuy * (D("1") - rebuy_disc / D("100"))
+        if base_for_rebuy not in (None, D("0"))
+        else None
+    )
+
+    return {
+        "coin": coin,
+        "amount": str(amount),
+        "price_usdc": str(price_now) if price_now is not None else None,
+        "change_24h_pct": change_pct(price_now, price_ref_window),  # 24h change
+
+        "dca_avg": str(dca_avg_D) if dca_avg_D is not None else None,
+        "sell_pct": str(sell_pct),
+        "sell_target": str(sell_target) if sell_target is not None else None,
+        "buy_pct": str(buy_pct),
+        "buy_target": str(buy_target) if buy_target is not None else None,
+        "rebuy_discount": str(rebuy_disc),
+        "rebuy_level": str(rebuy_level) if rebuy_level is not None else None,
+
+        "position_usdc": str(position_usdc) if position_usdc is not None else None,
+        "total_profit": str(inp.profit[i]),
+
+        "ref_kind": ref_kind,
+        "current_pct_from_ref": str(current_pct_from_ref.quantize(D('0.01'))) if current_pct_from_ref is not None else None,
+
+        "eligible": eligible
+    }
+
+def badge_rows_decimal(inp: BadgeInputs) -> List[dict]:
+    return [badge_row(inp, i) for i in range(len(inp.coins))]
+
+def change_pct(price: Optional[Decimal], window: Optional[Decimal]) -> Optional[str]:
+    """change_24h_pct of badge_row."""
+    if price is None or window in (None, D("0")):
+        return None
+    return str((((price / window) - D("1")) * D("100")).quantize(D('0.01')))
+
+def _present(col: fx.Column, mask: np.ndarray) -> fx.Column:
+    return col._replace(has=col.has & mask)
+
+def _exact(*cols: fx.Column) -> np.ndarray:
+    return np.logical_and.reduce([c.ok | ~c.has for c in cols])
+
+class BadgeBook:
+    """
+    Vectorized badge_row over all coins. Everything except change_24h_pct
+    depends only on the snapshot, the ledger and the config, so it is computed
+    once per snapshot; `rows(window)` adds the lookback change per request.
+    Coins (or cells) that fixedpoint can't represent exactly use the Decimal code.
+    """
+    def __init__(self, inp: BadgeInputs):
+        self.inp = inp
+        n = len(inp.coins)
+        amount, price = fx.column(inp.amount), fx.column(inp.price)
+        dca, initial, last_sell = fx.column(inp.dca), fx.column(inp.initial), fx.column(inp.last_sell)
+        one = fx.constant(D("1"), n)
+
+        position = fx.mul(amount, price)
+        ge_one, ge_exact = fx.at_least(position, one)
+        eligible = position.has & ge_one
+
+        ref = fx.where(eligible, dca, initial)
+        ref_kind = np.where(eligible, np.where(dca.has, "DCA", ""), np.where(initial.has, "INITIAL", ""))
+        current_pct = fx.pct_change(price, _present(ref, ~fx.is_zero(ref)))
+
+        sell_target = _present(fx.mul(dca, fx.add(one, fx.div100(fx.column(inp.sell_pct)))), eligible)
+        base_for_buy = _present(fx.where(initial.has, initial, price), ~eligible)
+        buy_target = fx.mul(base_for_buy, fx.add(one, fx.div100(fx.column(inp.buy_pct))))
+        base_for_rebuy = fx.where(eligible, dca, last_sell)
+        rebuy_level = _present(fx.mul(base_for_rebuy, fx.sub(one, fx.div100(fx.column(inp.rebuy_disc)))),
+                               ~fx.is_zero(base_for_rebuy))
+
+        exact = _exact(amount, price, dca, initial, last_sell,
+                       position, sell_target, buy_target, rebuy_level, current_pct) & (ge_exact | ~position.has)
+        self.price = price
+
+        cells = {name: fx.strings(col) for name, col in (
+            ("sell_target", sell_target), ("buy_target", buy_target), ("rebuy_level", rebuy_level),
+            ("position_usdc", position), ("current_pct_from_ref", current_pct))}
+        self.static: List[dict] = []
+        for i, coin in enumerate(inp.coins):
+            if not exact[i]:
+                self.static.append(badge_row(inp, i))
+                continue
+            dca_avg = inp.dca[i]
+            self.static.append({
+                "coin": coin,
+                "amount": str(inp.amount[i]),
+                "price_usdc": str(inp.price[i]) if inp.price[i] is not None else None,
+                "change_24h_pct": None,
+
+                "dca_avg": str(dca_avg) if dca_avg is not None else None,
+                "sell_pct": str(inp.sell_pct[i]),
+                "sell_target": cells["sell_target"][i],
+                "buy_pct": str(inp.buy_pct[i]),
+                "buy_target": cells["buy_target"][i],
+                "rebuy_discount": str(inp.rebuy_disc[i]),
+                "rebuy_level": cells["rebuy_level"][i],
+
+                "position_usdc": cells["position_usdc"][i],
+                "total_profit": str(inp.profit[i]),
+
+                "ref_kind": str(ref_kind[i]) or None,
+                "current_pct_from_ref": cells["current_pct_from_ref"][i],
+
+                "eligible": bool(eligible[i])
+            })
+
+    def rows(self, window: List[Optional[Decimal]]) -> List[dict]:
+        win = fx.column(window)
+        change = fx.pct_change(self.price, _present(win, ~fx.is_zero(win)))
+        exact = _exact(win, change)
+        texts = fx.strings(change)
+        return [
+            {**row, "change_24h_pct": texts[i] if exact[i] else change_pct(self.inp.price[i], window[i])}
+            for i, row in enumerate(self.static)
+        ]
+
+def badge_rows(inp: BadgeInputs) -> List[dict]:
+    """Same rows as badge_rows_decimal, with the arithmetic done once over all coins."""
+    return BadgeBook(inp).rows(inp.window)
+
+async def compute_badges(session: AsyncSession, lookback_hours: int = 24, rollup=None,
+                         snapshots: SnapshotCache = snapshot) -> dict:
+    """
+    Rows behind /api/coins/badges; `rollup` is passed through to the window price lookup.
+    Another bot database passes its own `session` and `snapshots`.
+    """
+    cfg = get_config()
+    enabled = [sym.upper() for sym, c in cfg.coins.items() if c.enabled]
+
+    # balances, trading_state (total_profit AND initial_price), latest prices; refreshes the ledger
+    snap = await snapshots.get()
+
+    now = datetime.utcnow()
+    since = now - timedelta(hours=lookback_hours)
+
+    # One set-based query for the window prices; DCA and last SELL come from the snapshot's ledger
+    coins = [c for c in enabled if c != "USDC"]
+    window_map = await crud.get_prices_at_or_after(session, coins, since, rollup=rollup)
+
+    inp = gather_inputs(cfg, snap, coins, window_map)
+    if not cfg.monitor.vector_math:
+        return {"coins": badge_rows_decimal(inp)}
+    book = snap.derived.get("badges")
+    if book is None:
+        book = snap.derived["badges"] = BadgeBook(inp)
+    return {"coins": book.rows(inp.window)}
+
+def portfolio_decimal(usdc_available: Decimal, coins: List[str], amounts: List[Decimal],
+                      prices: List[Optional[Decimal]]) -> dict:
+    """Reference Decimal computation of the portfolio summary."""
+    holdings_value = D("0")
+    breakdown = []
+
+    for coin, amount, price in zip(coins, amounts, prices):
+        value = amount * price if (price is not None) else None
+        if value is not None:
+            holdings_value += value
+
+        breakdown.append({
+            "coin": coin,
+            "amount": str(amount),
+            "price_usdc": str(price) if price is not None else None,
+            "value_usdc": str(value) if value is not None else None
+        })
+
+    total = usdc_available + holdings_value
+    q2 = lambda x: str(x.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+
+    return {
+        "usdc_available": q2(usdc_available),
+        "holdings_value_usdc": q2(holdings_value),
+        "total_usdc": q2(total),
+        "breakdown": breakdown
+    }
+
+def portfolio(usdc_available: Decimal, coins: List[str], amounts: List[Decimal],
+              prices: List[Optional[Decimal]]) -> dict:
+    """Same body as portfolio_decimal, vectorized; falls back to it if anything is out of range."""
+    values = fx.mul(fx.column(amounts), fx.column(prices))
+    holdings = fx.total(values)
+    usdc = fx.column([usdc_available])
+    total = fx.add(usdc, holdings)
+    sums = [fx.round2_half_up(c) for c in (usdc, holdings, total)]
+    if not (values.ok | ~values.has).all() or not all(bool(c.ok[0]) for c in sums):
+        return portfolio_decimal(usdc_available, coins, amounts, prices)
+
+    return {
+        "usdc_available": fx.fmt(sums[0], 0),
+        "holdings_value_usdc": fx.fmt(sums[1], 0),
+        "total_usdc": fx.fmt(sums[2], 0),
+        "breakdown": [{
+            "coin": coin,
+            "amount": str(amount),
+            "price_usdc": str(price) if price is not None else None,
+            "value_usdc": fx.fmt(values, i)
+        } for i, (coin, amount, price) in enumerate(zip(coins, amounts, prices))]
+    }
+
+async def compute_portfolio(snapshots: SnapshotCache = snapshot) -> dict:
+    """Body of /api/portfolio/summary, from the shared snapshot only."""
+    cfg = get_config()
+    enabled = [sym.upper() for sym, c in cfg.coins.items() if c.enabled]
+
+    # Balances & latest prices (already in USDC) from the shared snapshot
+    snap = await snapshots.get()
+    bal = snap.balances
+
+    coins = [c for c in enabled if c != "USDC"]
+    args = (bal.get("USDC", D("0")), coins, [bal.get(c, D("0")) for c in coins], [snap.prices.get(c) for c in coins])
+    return portfolio(*args) if cfg.monitor.vector_math else portfolio_decimal(*args)
+
+def _random_inputs(rng, n: int) -> BadgeInputs:
+    def dec(p_none=0.0, places=8, scale=1e4):
+        if rng.random() < p_none:
+            return None
+        if rng.random() < 0.05:
+            return D("0")
+        digits = int(rng.integers(0, places + 1))
+        return D(f"{rng.random() * scale:.{digits}f}")
+    def pct():
+        return D(rng.choice([1, 2.5, 3, 5, 10, 12.25, -0.2, 100, 0.0]))
+
+    coins = [f"C{i}" for i in range(n)]
+    price = [dec(0.1) for _ in coins]
+    window = []
+    for p in price:
+        # exact ±x.xx5% moves exercise the half-even rounding of change_24h_pct
+        if p is not None and p > 0 and rng.random() < 0.2:
+            window.append(p / D("1.00005"))
+        else:
+            window.append(dec(0.1))
+    return BadgeInputs(
+        coins=coins,
+        amount=[dec(0, scale=rng.choice([0.01, 1, 100])) for _ in coins],
+        price=price,
+        window=window,
+        dca=[dec(0.3) for _ in coins],
+        initial=[dec(0.3) for _ in coins],
+        last_sell=[dec(0.3) for _ in coins],
+        sell_pct=[pct() for _ in coins],
+        buy_pct=[pct() for _ in coins],
+        rebuy_disc=[pct() for _ in coins],
+        profit=[dec() for _ in coins],
+    )
+
+if __name__ == "__main__":
+    import sys, time
+    rng = np.random.default_rng(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+    mismatches = 0
+    for _ in range(200):
+        inp = _random_inputs(rng, 300)
+        ref = badge_rows_decimal(inp)
+        book = BadgeBook(inp)
+        mismatches += sum(a != b for a, b in zip(ref, book.rows(inp.window)))
+        usdc = inp.amount[0]
+        if portfolio(usdc, inp.coins, inp.amount, inp.price) != portfolio_decimal(usdc, inp.coins, inp.amount, inp.price):
+            mismatches += 1
+
+    t0 = time.perf_counter()
+    badge_rows_decimal(inp)
+    t1 = time.perf_counter()
+    book = BadgeBook(inp)
+    t2 = time.perf_counter()
+    book.rows(inp.window)
+    t3 = time.perf_counter()
+    print(f"badges: {mismatches} mismatches; {len(inp.coins)} coins: decimal {1000 * (t1 - t0):.2f} ms/request, "
+          f"vectorized {1000 * (t2 - t1):.2f} ms/snapshot + {1000 * (t3 - t2):.2f} ms/request")
+    sys.exit(1 if mismatches else 0)
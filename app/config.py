@@ -1,19 +1,40 @@
 import os, json
 from functools import lru_cache
-from typing import Dict, Optional
-from pydantic import BaseModel, Field, PositiveInt, validator
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field, NonNegativeInt, PositiveInt, root_validator, validator
 
 class TelegramCfg(BaseModel):
     enabled: bool = False
     bot_token: str = ""
     chat_id: Optional[int] = None
 
+class ReplicaCfg(BaseModel):
+    # Read-only standby for dashboard reads; unset keys fall back to the primary's
+    host: str
+    port: Optional[PositiveInt] = None
+    name: Optional[str] = None
+    user: Optional[str] = None
+    password: Optional[str] = None
+    pool_size: Optional[PositiveInt] = None
+    max_overflow: Optional[NonNegativeInt] = None
+    pool_recycle: Optional[int] = None
+    pool_pre_ping: Optional[bool] = None
+    statement_cache_size: Optional[NonNegativeInt] = None
+
 class DatabaseCfg(BaseModel):
     host: str
     port: PositiveInt = 5432
     name: str
     user: str
     password: str
+    # Monitor connection pool (the trader ignores these)
+    pool_size: PositiveInt = 5               # connections kept open
+    max_overflow: NonNegativeInt = 10        # extra connections allowed under burst
+    pool_recycle: int = 1800                 # seconds before a connection is replaced (-1 = never)
+    pool_pre_ping: bool = True               # test each connection on checkout (one extra round trip)
+    statement_cache_size: NonNegativeInt = 100  # asyncpg prepared statements per connection (0 for pgbouncer)
+    read_replica: Optional[ReplicaCfg] = None
+    source: Optional[str] = None             # name of this bot in merged responses (defaults to `name`)
 
     def as_url(self) -> str:
         return (
@@ -21,6 +42,13 @@ class DatabaseCfg(BaseModel):
             f"@{self.host}:{self.port}/{self.name}"
         )
 
+    def replica(self) -> Optional["DatabaseCfg"]:
+        """The read replica as a full DatabaseCfg, or None when none is configured."""
+        if self.read_replica is None:
+            return None
+        overrides = {k: v for k, v in self.read_replica.dict().items() if v is not None}
+        return DatabaseCfg(**{**self.dict(exclude={"read_replica"}), **overrides})
+
 class PrecisionCfg(BaseModel):
     price: int = 2
     amount: int = 6
@@ -44,6 +72,53 @@ class CoinCfg(BaseModel):
     min_order_sizes: MinOrderSizesCfg
     precision: PrecisionCfg
 
+class MonitorCfg(BaseModel):
+    # Monitor-only tuning; the trader ignores this section
+    snapshot_ttl: float = 2.0            # seconds a market snapshot is served from memory
+    live_interval: float = 2.0           # seconds between /ws/live ticks
+    live_queue_size: PositiveInt = 8     # outbound messages buffered per /ws/live client
+    live_send_timeout: float = 5.0       # seconds a single send may take before the client is evicted
+    live_slow_policy: str = "latest"     # full queue: "latest" keeps only the newest message, "evict" disconnects
+    rollups_enabled: bool = True         # maintain price_rollup_{1m,15m,1h} tables in the bot DB
+    rollup_interval: float = 30.0        # seconds between incremental rollup passes
+    rollup_backfill_hours: PositiveInt = 24  # history folded in per pass while catching up
+    check_query_plans: bool = False      # EXPLAIN the hot queries at startup, warn on sequential scans
+    live_notify: bool = False            # push /ws/live ticks from LISTEN/NOTIFY (needs `python -m app.notify` triggers)
+    live_notify_coalesce: float = 0.25   # seconds of notifications folded into one tick
+    live_notify_min_interval: float = 1.0  # fewest seconds between notification-driven ticks
+    live_heartbeat: float = 30.0         # seconds between ticks in notify mode when nothing changed
+    stream_interval: float = 5.0         # seconds between /api/stream badge/portfolio recomputes
+    stream_heartbeat: float = 15.0       # seconds of silence before /api/stream sends a keep-alive comment
+    stream_history: PositiveInt = 1000   # events kept for Last-Event-ID resume
+    slow_query_ms: float = 0.0           # log statements slower than this (0 = off)
+    vector_math: bool = True             # badge/portfolio math over NumPy columns (False = per-coin Decimal)
+    price_import: bool = False           # accept POST /api/price_history/import (COPY into price_history)
+    retention_enabled: bool = False      # trim price_history and the fine rollups (needs rollups_enabled)
+    retention_raw_days: NonNegativeInt = 7    # raw ticks kept (0 = forever)
+    retention_1m_days: NonNegativeInt = 90    # 1-minute bars kept (0 = forever)
+    retention_15m_days: NonNegativeInt = 0    # 15-minute bars kept (0 = forever); hourly bars are always kept
+    retention_interval: float = 3600.0   # seconds between retention passes
+    retention_batch_size: PositiveInt = 5000  # rows per DELETE transaction
+    retention_batch_pause: float = 0.1   # seconds between DELETE batches
+    indicators_enabled: bool = True      # RSI / MACD / EMA trend / volatility per coin at /api/indicators and in /ws/live
+    indicator_interval: PositiveInt = 60 # seconds per indicator sample (bucket close)
+    indicator_warmup: PositiveInt = 1000 # samples loaded to rebuild the indicators at startup
+    indicator_poll: float = 5.0          # seconds between folding in new ticks
+    equity_bucket: PositiveInt = 3600    # seconds per /api/portfolio/history bucket (a multiple of 60 reads the rollups)
+    simulate_workers: NonNegativeInt = 0 # processes for /api/simulate grids (0 = one per CPU)
+    simulate_max_sets: PositiveInt = 2000  # largest parameter grid /api/simulate accepts
+    coordination: bool = False           # elect one uvicorn worker to run the pollers (see app/coord.py)
+    coordination_socket: str = "/tmp/cryptobot-monitor.sock"  # leader -> followers channel
+    coordination_lock_key: int = 7317    # pg advisory lock id; unique per monitor sharing a database
+    coordination_retry: float = 2.0      # seconds between lock attempts / leader health checks
+    source_timeout: float = 5.0          # seconds each bot database gets when a request fans out to several
+
+    @validator("live_slow_policy")
+    def known_policy(cls, v):
+        if v not in ("latest", "evict"):
+            raise ValueError('live_slow_policy must be "latest" or "evict"')
+        return v
+
 class AppCfg(BaseModel):
     name: str = ""
     privateKey: str = ""                 # keep in Secret in k8s
@@ -55,8 +130,31 @@ class AppCfg(BaseModel):
     stop_loss_percentage: float = -50
     trail_percent: float = 1
     telegram: TelegramCfg = TelegramCfg()
-    database: DatabaseCfg
+    database: DatabaseCfg                # the first source when several are given
+    databases: List[DatabaseCfg] = Field(default_factory=list)  # every source, `database` first
     coins: Dict[str, CoinCfg] = Field(default_factory=dict)
+    monitor: MonitorCfg = MonitorCfg()
+
+    @root_validator(pre=True)
+    def database_list(cls, values):
+        # "database" may be a list of bot databases; the first one hosts the rollups and takes writes
+        db = values.get("database")
+        if isinstance(db, list):
+            if not db:
+                raise ValueError("database must not be an empty list")
+            values = {**values, "database": db[0], "databases": db}
+        return values
+
+    @root_validator(skip_on_failure=True)
+    def named_sources(cls, values):
+        dbs = values.get("databases") or [values["database"]]
+        for db in dbs:
+            db.source = db.source or db.name
+        names = [db.source for db in dbs]
+        if len(set(names)) != len(names):
+            raise ValueError(f"database sources need distinct names, got {names}")
+        values["database"], values["databases"] = dbs[0], dbs
+        return values
 
     @validator("coins")
     def at_least_one_coin(cls, v):
@@ -72,6 +170,8 @@ def get_config() -> AppCfg:
 
     # Optional ENV overrides so ops can swap creds without touching the file
     db = data.setdefault("database", {})
+    if isinstance(db, list):
+        db = db[0] if db else {}
     for k, env in {
         "host": "DB_HOST",
         "port": "DB_PORT",
@@ -81,5 +181,69 @@ def get_config() -> AppCfg:
     }.items():
         if os.getenv(env):
             db[k] = os.getenv(env) if k != "port" else int(os.getenv(env))
+    for k, env in {
+        "pool_size": "DB_POOL_SIZE",
+        "max_overflow": "DB_MAX_OVERFLOW",
+        "pool_recycle": "DB_POOL_RECYCLE",
+        "pool_pre_ping": "DB_POOL_PRE_PING",
+        "statement_cache_size": "DB_STATEMENT_CACHE_SIZE",
+    }.items():
+        if os.getenv(env):
+            db[k] = os.getenv(env)
+    if os.getenv("DB_REPLICA_HOST"):
+        db["read_replica"] = {**(db.get("read_replica") or {}), "host": os.getenv("DB_REPLICA_HOST")}
+    if db.get("read_replica"):
+        for k, env in {
+            "port": "DB_REPLICA_PORT",
+            "name": "DB_REPLICA_NAME",
+            "user": "DB_REPLICA_USER",
+            "password": "DB_REPLICA_PASSWORD",
+        }.items():
+            if os.getenv(env):
+                db["read_replica"][k] = os.getenv(env)
+
+    mon = data.setdefault("monitor", {})
+    for k, env in {
+        "snapshot_ttl": "SNAPSHOT_TTL",
+        "live_interval": "LIVE_INTERVAL",
+        "live_queue_size": "LIVE_QUEUE_SIZE",
+        "live_send_timeout": "LIVE_SEND_TIMEOUT",
+        "live_slow_policy": "LIVE_SLOW_POLICY",
+        "rollups_enabled": "ROLLUPS_ENABLED",
+        "rollup_interval": "ROLLUP_INTERVAL",
+        "rollup_backfill_hours": "ROLLUP_BACKFILL_HOURS",
+        "check_query_plans": "CHECK_QUERY_PLANS",
+        "live_notify": "LIVE_NOTIFY",
+        "live_notify_coalesce": "LIVE_NOTIFY_COALESCE",
+        "live_notify_min_interval": "LIVE_NOTIFY_MIN_INTERVAL",
+        "live_heartbeat": "LIVE_HEARTBEAT",
+        "stream_interval": "STREAM_INTERVAL",
+        "stream_heartbeat": "STREAM_HEARTBEAT",
+        "stream_history": "STREAM_HISTORY",
+        "vector_math": "VECTOR_MATH",
+        "slow_query_ms": "SLOW_QUERY_MS",
+        "price_import": "PRICE_IMPORT",
+        "retention_enabled": "RETENTION_ENABLED",
+        "retention_raw_days": "RETENTION_RAW_DAYS",
+        "retention_1m_days": "RETENTION_1M_DAYS",
+        "retention_15m_days": "RETENTION_15M_DAYS",
+        "retention_interval": "RETENTION_INTERVAL",
+        "retention_batch_size": "RETENTION_BATCH_SIZE",
+        "retention_batch_pause": "RETENTION_BATCH_PAUSE",
+        "indicators_enabled": "INDICATORS_ENABLED",
+        "indicator_interval": "INDICATOR_INTERVAL",
+        "indicator_warmup": "INDICATOR_WARMUP",
+        "indicator_poll": "INDICATOR_POLL",
+        "equity_bucket": "EQUITY_BUCKET",
+        "simulate_workers": "SIMULATE_WORKERS",
+        "simulate_max_sets": "SIMULATE_MAX_SETS",
+        "coordination": "COORDINATION",
+        "coordination_socket": "COORDINATION_SOCKET",
+        "coordination_lock_key": "COORDINATION_LOCK_KEY",
+        "coordination_retry": "COORDINATION_RETRY",
+        "source_timeout": "SOURCE_TIMEOUT",
+    }.items():
+        if os.getenv(env):
+            mon[k] = os.getenv(env)
 
     return AppCfg(**data)
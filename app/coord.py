@@ -0,0 +1,205 @@
+"""
+Leader election between the uvicorn workers of one host.
+
+Every worker competes for a Postgres session-level advisory lock on its own
+asyncpg connection. The holder is the leader: it runs the producers (live
+feed and stream ticks, rollups, retention, the change listener) and serves a
+Unix socket on which it publishes what they produce. The other workers are
+followers: they connect to the socket, tell the leader which /ws/live groups
+and whether /api/stream subscribers they have, and only fan the published
+messages out to their own clients.
+
+Postgres drops the lock with the leader's connection, so when the leader
+process dies a follower's next attempt (every `retry` seconds) wins, it
+starts the producers and re-creates the socket, and the other followers
+reconnect to it. A leader that loses its lock connection steps down.
+
+Messages are JSON lines: {"kind": ..., ...}.
+"""
+import asyncio, json, logging, os, time
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncpg
+
+from .config import DatabaseCfg
+
+log = logging.getLogger(__name__)
+
+# followers whose socket buffer grows past this are dropped; they reconnect and resync
+MAX_BUFFERED = 4 * 1024 * 1024
+MAX_LINE = 16 * 1024 * 1024
+
+class Coordinator:
+    def __init__(self, db: DatabaseCfg, socket_path: str, lock_key: int, retry: float = 2.0):
+        self.db = db
+        self.socket_path = socket_path
+        self.lock_key = lock_key
+        self.retry = retry
+        self.leader = False
+        self.elections = 0
+        self.leader_since: Optional[float] = None
+        # wired by main:
+        self.on_lead: Callable[[], Awaitable[None]] = _noop
+        self.on_follow: Callable[[], Awaitable[None]] = _noop
+        self.handlers: Dict[str, Callable[[dict], None]] = {}    # follower: kind -> handler
+        self.hello: Callable[[], List[dict]] = list              # leader: messages for a new follower
+        self.state: Callable[[], List[dict]] = list              # leader: messages repeated every `retry` s
+        self.demand: Callable[[], dict] = dict                   # follower: what its clients need
+        self.on_demand: Callable[[List[dict]], None] = lambda demands: None   # leader: all followers' demand
+        self._followers: Dict[asyncio.StreamWriter, dict] = {}
+        self._upstream: Optional[asyncio.StreamWriter] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._task: Optional[asyncio.Task] = None
+        self._client_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="coordinator")
+            self._client_task = asyncio.create_task(self._follow_loop(), name="coordinator-client")
+
+    async def stop(self):
+        for task in (self._client_task, self._task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._client_task = None
+        if self.leader:
+            await self._step_down()
+
+    # --- election ---
+    async def _run(self):
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(host=self.db.host, port=self.db.port, user=self.db.user,
+                                             password=self.db.password, database=self.db.name)
+                while not await conn.fetchval("SELECT pg_try_advisory_lock($1)", self.lock_key):
+                    await asyncio.sleep(self.retry)
+                await self._take_over()
+                # hold the lock for as long as this connection answers
+                while True:
+                    await asyncio.sleep(self.retry)
+                    await asyncio.wait_for(conn.fetchval("SELECT 1"), timeout=self.retry * 2)
+                    for msg in self.state():
+                        self.publish(msg)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("coordination: lock connection failed: %s", e)
+            finally:
+                if conn is not None and not conn.is_closed():
+                    conn.terminate()
+            if self.leader:
+                await self._step_down()
+            await asyncio.sleep(self.retry)
+
+    async def _take_over(self):
+        log.info("coordination: worker %d is the leader", os.getpid())
+        self.leader = True
+        self.elections += 1
+        self.leader_since = time.time()
+        if self._upstream is not None:
+            self._upstream.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)       # left behind by a dead leader
+        self._server = await asyncio.start_unix_server(self._serve, path=self.socket_path)
+        await self.on_lead()
+
+    async def _step_down(self):
+        log.warning("coordination: worker %d is no longer the leader", os.getpid())
+        self.leader = False
+        self.leader_since = None
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for writer in list(self._followers):
+            writer.close()
+        self._followers.clear()
+        await self.on_follow()
+
+    # --- leader side ---
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._followers[writer] = {}
+        try:
+            for msg in self.hello() + self.state():
+                writer.write(_encode(msg))
+            while line := await reader.readline():
+                self._followers[writer] = json.loads(line)
+                self.on_demand(list(self._followers.values()))
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self._followers.pop(writer, None)
+            self.on_demand(list(self._followers.values()))
+            writer.close()
+
+    @property
+    def followers(self) -> int:
+        return len(self._followers)
+
+    def publish(self, msg: dict):
+        """Send `msg` to every follower; no-op on a follower or with none connected."""
+        if not self._followers:
+            return
+        data = _encode(msg)
+        for writer in list(self._followers):
+            if writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+                log.warning("coordination: dropping a follower that stopped reading")
+                self._followers.pop(writer, None)
+                writer.close()
+                continue
+            writer.write(data)
+
+    # --- follower side ---
+    async def _follow_loop(self):
+        while True:
+            if self.leader or not os.path.exists(self.socket_path):
+                await asyncio.sleep(self.retry / 4)
+                continue
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=MAX_LINE)
+            except OSError:
+                await asyncio.sleep(self.retry / 4)
+                continue
+            self._upstream = writer
+            sender = asyncio.create_task(self._send_demand(writer))
+            try:
+                while line := await reader.readline():
+                    msg = json.loads(line)
+                    handler = self.handlers.get(msg.get("kind"))
+                    if handler is not None:
+                        handler(msg)
+            except (ConnectionError, ValueError) as e:
+                log.warning("coordination: leader connection lost: %s", e)
+            finally:
+                sender.cancel()
+                self._upstream = None
+                writer.close()
+
+    async def _send_demand(self, writer: asyncio.StreamWriter):
+        last = None
+        while True:
+            demand = self.demand()
+            if demand != last:
+                writer.write(_encode(demand))
+                last = demand
+            await asyncio.sleep(0.25)
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "role": "leader" if self.leader else "follower",
+            "leader_since": self.leader_since,
+            "elections_won": self.elections,
+            "followers": self.followers,
+            "connected_to_leader": self._upstream is not None,
+            "socket": self.socket_path,
+        }
+
+async def _noop():
+    pass
+
+def _encode(msg: dict) -> bytes:
+    return json.dumps(msg, default=str, separators=(",", ":")).encode() + b"\n"
@@ -1,5 +1,7 @@
-from typing import List, Optional
-from sqlalchemy import select, desc, and_
+from typing import Dict, List, Optional, Tuple
+from decimal import Decimal
+from sqlalchemy import BigInteger, Float, Integer, Interval, Text, cast, select, desc, and_, func, values, column, literal, tuple_, union_all
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from .models import Balance, BotStatus, Trade, PriceHistory, TradingState, ManualCommand
@@ -12,13 +14,68 @@ async def get_balances(session: AsyncSession) -> List[Balance]:
     res = await session.execute(select(Balance).order_by(Balance.currency))
     return list(res.scalars().all())
 
-async def get_trades(session: AsyncSession, limit: int = 50, symbol: Optional[str] = None) -> List[Trade]:
+def trades_stmt(limit: int = 50, symbol: Optional[str] = None):
     stmt = select(Trade).order_by(desc(Trade.timestamp)).limit(limit)
     if symbol:
         stmt = select(Trade).where(Trade.symbol == symbol).order_by(desc(Trade.timestamp)).limit(limit)
-    res = await session.execute(stmt)
+    return stmt
+
+async def get_trades(session: AsyncSession, limit: int = 50, symbol: Optional[str] = None) -> List[Trade]:
+    res = await session.execute(trades_stmt(limit, symbol))
     return list(res.scalars().all())
 
+TRADE_COLUMNS = (Trade.id, Trade.symbol, Trade.side, Trade.amount, Trade.price, Trade.timestamp)
+
+def _trade_filters(symbol: Optional[str], side: Optional[str], since: Optional[datetime], until: Optional[datetime]):
+    # keyset paging needs a total order; trades without a timestamp can't be placed in it
+    conds = [Trade.timestamp.isnot(None)]
+    if symbol:
+        conds.append(Trade.symbol == symbol)
+    if side:
+        conds.append(Trade.side == side)
+    if since is not None:
+        conds.append(Trade.timestamp >= since)
+    if until is not None:
+        conds.append(Trade.timestamp < until)
+    return conds
+
+def trades_page_stmt(limit: int, symbol: Optional[str] = None, side: Optional[str] = None,
+                     since: Optional[datetime] = None, until: Optional[datetime] = None,
+                     before: Optional[Tuple[datetime, int]] = None, after: Optional[Tuple[datetime, int]] = None):
+    """
+    One page of trades keyed on (timestamp, id), newest first: the `limit`
+    trades older than `before`, or, with `after`, the `limit` trades just newer
+    than it (returned oldest first; the caller reverses them).
+    """
+    key = tuple_(Trade.timestamp, Trade.id)
+    stmt = select(*TRADE_COLUMNS).where(*_trade_filters(symbol, side, since, until))
+    if after is not None:
+        return stmt.where(key > tuple_(*after)).order_by(Trade.timestamp, Trade.id).limit(limit)
+    if before is not None:
+        stmt = stmt.where(key < tuple_(*before))
+    return stmt.order_by(desc(Trade.timestamp), desc(Trade.id)).limit(limit)
+
+def trades_export_stmt(symbol: Optional[str] = None, side: Optional[str] = None,
+                       since: Optional[datetime] = None, until: Optional[datetime] = None):
+    return (
+        select(*TRADE_COLUMNS)
+        .where(*_trade_filters(symbol, side, since, until))
+        .order_by(Trade.timestamp, Trade.id)
+    )
+
+def last_trade_stmt():
+    return (
+        select(Trade.symbol, Trade.side, Trade.amount, Trade.price, Trade.timestamp)
+        .order_by(desc(Trade.timestamp))
+        .limit(1)
+    )
+
+def latest_price_ts_stmt():
+    return select(func.max(PriceHistory.timestamp))
+
+def symbols_updated_since_stmt(cutoff: datetime):
+    return select(func.count(func.distinct(PriceHistory.symbol))).where(PriceHistory.timestamp >= cutoff)
+
 async def get_price_history(session: AsyncSession, symbol: str, hours: int = 24) -> List[PriceHistory]:
     since = datetime.utcnow() - timedelta(hours=hours)
     stmt = (
@@ -29,6 +86,141 @@ async def get_price_history(session: AsyncSession, symbol: str, hours: int = 24)
     res = await session.execute(stmt)
     return list(res.scalars().all())
 
+def price_export_stmt(symbol: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None):
+    # (symbol, timestamp) is the primary key, so this walks the index in order
+    conds = []
+    if symbol:
+        conds.append(PriceHistory.symbol == symbol)
+    if since is not None:
+        conds.append(PriceHistory.timestamp >= since)
+    if until is not None:
+        conds.append(PriceHistory.timestamp < until)
+    return (
+        select(PriceHistory.symbol, PriceHistory.timestamp, PriceHistory.price)
+        .where(*conds)
+        .order_by(PriceHistory.symbol, PriceHistory.timestamp)
+    )
+
+async def get_price_points(session: AsyncSession, symbol: str, hours: int = 24) -> List[Tuple[datetime, Optional[Decimal]]]:
+    """Same rows as get_price_history, as plain (timestamp, price) tuples."""
+    since = datetime.utcnow() - timedelta(hours=hours)
+    stmt = (
+        select(PriceHistory.timestamp, PriceHistory.price)
+        .where(and_(PriceHistory.symbol == symbol, PriceHistory.timestamp >= since))
+        .order_by(PriceHistory.timestamp)
+    )
+    res = await session.execute(stmt)
+    return [tuple(r) for r in res.all()]
+
+async def get_price_columns(session: AsyncSession, symbol: str, hours: int = 24) -> List[Tuple[int, float]]:
+    """Same rows as get_price_history as (epoch ms, float price), converted in SQL."""
+    since = datetime.utcnow() - timedelta(hours=hours)
+    stmt = (
+        select(
+            cast(func.extract("epoch", PriceHistory.timestamp) * 1000, BigInteger),
+            cast(func.coalesce(PriceHistory.price, 0), Float),
+        )
+        .where(and_(PriceHistory.symbol == symbol, PriceHistory.timestamp >= since))
+        .order_by(PriceHistory.timestamp)
+    )
+    res = await session.execute(stmt)
+    return res.all()
+
+def ticks_after_stmt(symbols: List[str], cursor: datetime):
+    """Ticks of `symbols` newer than `cursor`, oldest first (ix_price_history_timestamp)."""
+    return (
+        select(PriceHistory.symbol, PriceHistory.timestamp, PriceHistory.price)
+        .where(and_(PriceHistory.timestamp > cursor, PriceHistory.symbol.in_(symbols), PriceHistory.price.is_not(None)))
+        .order_by(PriceHistory.timestamp)
+    )
+
+BUCKET_ORIGIN = datetime(2000, 1, 1)
+
+def floor_bucket(ts: datetime, width: int) -> datetime:
+    """Python twin of date_bin(width, ts, BUCKET_ORIGIN)."""
+    delta = ts - BUCKET_ORIGIN
+    secs = delta.days * 86400 + delta.seconds
+    return BUCKET_ORIGIN + timedelta(seconds=secs - secs % width)
+
+def ceil_bucket(ts: datetime, width: int) -> datetime:
+    """Start of the first bucket at or after `ts`."""
+    start = floor_bucket(ts, width)
+    return start if start == ts else start + timedelta(seconds=width)
+
+# Tick sources share one shape, (symbol, ts, open, high, low, close, n), so
+# raw rows and rollup rows can be unioned and re-bucketed by aggregate_ticks.
+def raw_ticks(symbol: Optional[str], start: datetime, end: Optional[datetime] = None):
+    conds = [PriceHistory.price.is_not(None), PriceHistory.timestamp >= start]
+    if end is not None:
+        conds.append(PriceHistory.timestamp < end)
+    if symbol:
+        conds.append(PriceHistory.symbol == symbol)
+    return select(
+        PriceHistory.symbol,
+        PriceHistory.timestamp.label("ts"),
+        PriceHistory.price.label("open"),
+        PriceHistory.price.label("high"),
+        PriceHistory.price.label("low"),
+        PriceHistory.price.label("close"),
+        literal(1, Integer).label("n"),
+    ).where(*conds)
+
+def rollup_ticks(model, symbol: Optional[str], start: datetime, end: Optional[datetime] = None):
+    conds = [model.bucket >= start]
+    if end is not None:
+        conds.append(model.bucket < end)
+    if symbol:
+        conds.append(model.symbol == symbol)
+    return select(
+        model.symbol,
+        model.bucket.label("ts"),
+        model.open, model.high, model.low, model.close,
+        model.count.label("n"),
+    ).where(*conds)
+
+def aggregate_ticks(ticks, bucket_seconds: int):
+    """(symbol, bucket, open, high, low, close, count) per date_bin bucket of `ticks`."""
+    t = ticks.subquery()
+    width = literal(timedelta(seconds=bucket_seconds), Interval)
+    binned = select(t, func.date_bin(width, t.c.ts, BUCKET_ORIGIN).label("bucket")).subquery()
+    return (
+        select(
+            binned.c.symbol,
+            binned.c.bucket,
+            func.array_agg(aggregate_order_by(binned.c.open, binned.c.ts))[1].label("open"),
+            func.max(binned.c.high).label("high"),
+            func.min(binned.c.low).label("low"),
+            func.array_agg(aggregate_order_by(binned.c.close, binned.c.ts.desc()))[1].label("close"),
+            func.sum(binned.c.n).label("count"),
+        )
+        .group_by(binned.c.symbol, binned.c.bucket)
+        .order_by(binned.c.symbol, binned.c.bucket)
+    )
+
+def ticks_since(symbol: Optional[str], since: datetime, rollup=None, rollup_until: Optional[datetime] = None):
+    """
+    Ticks from `since`; with `rollup`, its complete buckets before `rollup_until` stand in for raw ticks.
+    A bucket that starts before `since` is not used: the raw ticks up to the next boundary are read instead.
+    """
+    if rollup is not None and rollup_until is not None:
+        start = ceil_bucket(since, rollup.width)
+        if rollup_until > start:
+            return union_all(raw_ticks(symbol, since, start), rollup_ticks(rollup, symbol, start, rollup_until),
+                             raw_ticks(symbol, rollup_until))
+    return raw_ticks(symbol, since)
+
+async def get_price_ohlc(session: AsyncSession, symbol: str, hours: int, bucket_seconds: int,
+                         rollup=None, rollup_until: Optional[datetime] = None) -> List[Tuple]:
+    """
+    OHLC bars of `bucket_seconds` for the last `hours`, aggregated in SQL.
+    With `rollup`, complete rollup buckets before `rollup_until` stand in for raw ticks.
+    Rows are (bucket, open, high, low, close, count), oldest first.
+    """
+    since = datetime.utcnow() - timedelta(hours=hours)
+    ticks = ticks_since(symbol, since, rollup, rollup_until)
+    res = await session.execute(aggregate_ticks(ticks, bucket_seconds))
+    return [tuple(r)[1:] for r in res.all()]
+
 async def get_state(session: AsyncSession, symbol: Optional[str] = None) -> List[TradingState]:
     stmt = select(TradingState)
     if symbol:
@@ -42,3 +234,87 @@ async def insert_manual_command(session: AsyncSession, symbol: str, action: str,
     await session.commit()
     await session.refresh(cmd)
     return cmd
+
+# --- Set-based lookups (one round trip for any number of symbols) ---
+def _symbols_table(symbols: List[str]):
+    return values(column("symbol", Text), name="syms").data([(s,) for s in symbols])
+
+def latest_prices_stmt(symbols: List[str]):
+    syms = _symbols_table(symbols)
+    latest = (
+        select(PriceHistory.price)
+        .where(PriceHistory.symbol == syms.c.symbol)
+        .order_by(desc(PriceHistory.timestamp))
+        .limit(1)
+        .scalar_subquery()
+    )
+    return select(syms.c.symbol, latest)
+
+async def get_latest_prices(session: AsyncSession, symbols: List[str]) -> Dict[str, Optional[Decimal]]:
+    """Newest price per symbol; a symbol with no rows maps to None."""
+    if not symbols:
+        return {}
+    res = await session.execute(latest_prices_stmt(symbols))
+    return {sym: price for sym, price in res.all()}
+
+def prices_at_or_after_stmt(symbols: List[str], since: datetime, rollup=None):
+    """
+    First price at/after `since` per symbol, falling back to the last one before it.
+    With `rollup`, raw ticks are only probed inside the bucket around `since`
+    and the rollup answers beyond it; raw is still the fallback while it lags.
+    Past the raw retention horizon the raw probes find nothing and the rollup
+    (see RollupService.window_rollup) answers alone.
+    """
+    syms = _symbols_table(symbols)
+
+    def raw(*conds, newest=False):
+        return (
+            select(PriceHistory.price)
+            .where(and_(PriceHistory.symbol == syms.c.symbol, *conds))
+            .order_by(desc(PriceHistory.timestamp) if newest else PriceHistory.timestamp)
+            .limit(1)
+            .scalar_subquery()
+        )
+
+    if rollup is None:
+        candidates = [
+            raw(PriceHistory.timestamp >= since),
+            raw(PriceHistory.timestamp < since, newest=True),
+        ]
+    else:
+        m = rollup
+        start = floor_bucket(since, m.width)
+        edge = start + timedelta(seconds=m.width)
+        candidates = [
+            raw(PriceHistory.timestamp >= since, PriceHistory.timestamp < edge),
+            select(m.open).where(and_(m.symbol == syms.c.symbol, m.bucket >= edge))
+                .order_by(m.bucket).limit(1).scalar_subquery(),
+            raw(PriceHistory.timestamp >= since),
+            raw(PriceHistory.timestamp < since, PriceHistory.timestamp >= start, newest=True),
+            select(m.close).where(and_(m.symbol == syms.c.symbol, m.bucket < start))
+                .order_by(desc(m.bucket)).limit(1).scalar_subquery(),
+            raw(PriceHistory.timestamp < since, newest=True),
+        ]
+    return select(syms.c.symbol, func.coalesce(*candidates))
+
+async def get_prices_at_or_after(session: AsyncSession, symbols: List[str], since: datetime,
+                                 rollup=None) -> Dict[str, Optional[Decimal]]:
+    if not symbols:
+        return {}
+    res = await session.execute(prices_at_or_after_stmt(symbols, since, rollup))
+    return {sym: price for sym, price in res.all()}
+
+# --- Change watermarks (HTTP ETags) ---
+def _table_digest(*cols, order_by):
+    row = func.concat_ws("|", *[func.coalesce(cast(c, Text), "") for c in cols])
+    return func.md5(func.string_agg(row, aggregate_order_by(literal(","), order_by)))
+
+def watermarks_stmt():
+    """max trade id, newest price timestamp, and digests of balances / trading_state, in one round trip."""
+    return select(
+        select(func.max(Trade.id)).scalar_subquery(),
+        select(func.max(PriceHistory.timestamp)).scalar_subquery(),
+        select(_table_digest(Balance.currency, Balance.available_balance, order_by=Balance.currency)).scalar_subquery(),
+        select(_table_digest(TradingState.symbol, TradingState.initial_price, TradingState.total_trades,
+                             TradingState.total_profit, order_by=TradingState.symbol)).scalar_subquery(),
+    )
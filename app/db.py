@@ -1,12 +1,69 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from typing import Dict
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import declarative_base
-from .config import get_config
+from .config import get_config, DatabaseCfg
 
 cfg = get_config()  # loads once, cached
-engine = create_async_engine(cfg.database.as_url(), pool_pre_ping=True)
+
+def make_engine(db: DatabaseCfg) -> AsyncEngine:
+    # statement_cache_size sizes both asyncpg's cache and SQLAlchemy's prepared-statement cache
+    url = make_url(db.as_url()).update_query_dict({"prepared_statement_cache_size": str(db.statement_cache_size)})
+    return create_async_engine(
+        url,
+        pool_size=db.pool_size,
+        max_overflow=db.max_overflow,
+        pool_recycle=db.pool_recycle,
+        pool_pre_ping=db.pool_pre_ping,
+        connect_args={"statement_cache_size": db.statement_cache_size},
+    )
+
+engine = make_engine(cfg.database)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+
+# Read-only endpoints and background readers use the replica when one is configured
+_replica = cfg.database.replica()
+read_engine: AsyncEngine = make_engine(_replica) if _replica is not None else engine
+ReadSessionLocal = async_sessionmaker(read_engine, expire_on_commit=False) if _replica is not None else AsyncSessionLocal
 Base = declarative_base()
 
+# Every bot database when `database` is a list: the first is the one above, the
+# others get their own (read-only) pool, on their replica when they have one
+source_dbs: Dict[str, DatabaseCfg] = {cfg.database.source: _replica or cfg.database}
+source_engines: Dict[str, AsyncEngine] = {cfg.database.source: read_engine}
+for _db in cfg.databases[1:]:
+    source_dbs[_db.source] = _db.replica() or _db
+    source_engines[_db.source] = make_engine(source_dbs[_db.source])
+SourceSessions: Dict[str, async_sessionmaker] = {
+    name: ReadSessionLocal if e is read_engine else async_sessionmaker(e, expire_on_commit=False)
+    for name, e in source_engines.items()
+}
+
 async def get_session() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         yield session
+
+async def get_read_session() -> AsyncSession:
+    async with ReadSessionLocal() as session:
+        yield session
+
+def _pool_stats(e: AsyncEngine, db: DatabaseCfg) -> dict:
+    pool = e.pool
+    return {
+        "host": db.host,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": db.max_overflow,
+        "recycle": db.pool_recycle,
+        "pre_ping": db.pool_pre_ping,
+        "statement_cache_size": db.statement_cache_size,
+    }
+
+def pool_stats() -> dict:
+    return {
+        "primary": _pool_stats(engine, cfg.database),
+        "replica": _pool_stats(read_engine, _replica) if _replica is not None else None,
+        "sources": {name: _pool_stats(e, source_dbs[name]) for name, e in source_engines.items() if e is not read_engine},
+    }
@@ -0,0 +1,173 @@
+"""
+Portfolio equity over time, for /api/portfolio/history.
+
+Holdings are rebuilt by replaying `trades` (a BUY adds `amount` of the coin
+and spends `amount * price` USDC, a SELL the reverse) into one row per
+`equity_bucket`-second bucket, and valued at each coin's close in that
+bucket, carried forward while a coin has no ticks (an as-of join). The
+replay only knows changes, so the curve is anchored on today's balances: the
+newest row equals them and older rows differ by the trades in between. Fees
+the bot paid and deposits or withdrawals are not in `trades` and shift the
+older part of the curve by the amount they moved.
+
+The matrices are kept in memory and grow incrementally: trades beyond the
+last replayed id are folded in, and closes are re-read only from the first
+bucket that was still open at the last refresh (from the hourly rollup where
+it is built). A year-long request after a warm one costs a few buckets of SQL.
+"""
+import asyncio, logging, time
+from datetime import datetime, timedelta
+from typing import Dict, List, Mapping, Optional
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Trade
+from . import crud
+
+log = logging.getLogger(__name__)
+
+HISTORY_DAYS = 365          # oldest bucket kept; older trades fold into the first row
+
+def _ffill(a: np.ndarray, seed: Optional[np.ndarray] = None) -> np.ndarray:
+    """Carry each column's last non-NaN value down over its NaNs, starting from `seed`."""
+    if seed is not None:
+        a = np.vstack([seed, a])
+    idx = np.where(np.isnan(a), 0, np.arange(len(a))[:, None])
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    out = a[idx, np.arange(a.shape[1])]
+    return out[1:] if seed is not None else out
+
+class EquityCurve:
+    """
+    Cumulative holdings per bucket and asset (`holdings`, `cash` for USDC)
+    and as-of closes (`prices`), one row per bucket from `origin`. `cursor`
+    is the last replayed trade id; rows before `priced` have final closes.
+    """
+    def __init__(self, rollups, width: int = 3600):
+        self.rollups = rollups
+        self.width = width
+        self.origin: Optional[datetime] = None
+        self.assets: List[str] = []
+        self._col: Dict[str, int] = {}
+        self.holdings = np.zeros((0, 0))
+        self.cash = np.zeros(0)
+        self.prices = np.zeros((0, 0))
+        self.cursor: Optional[int] = None
+        self.priced = 0
+        self.trades = 0
+        self.last_refresh: Optional[dict] = None
+        self._lock = asyncio.Lock()
+
+    def _row(self, ts: datetime) -> int:
+        return (crud.floor_bucket(ts, self.width) - self.origin) // timedelta(seconds=self.width)
+
+    def _grow(self, rows: int):
+        """Extend to `rows` rows; holdings carry forward, closes are unknown yet."""
+        extra = rows - len(self.cash)
+        if extra <= 0:
+            return
+        last = self.holdings[-1:] if len(self.cash) else np.zeros((1, len(self.assets)))
+        self.holdings = np.vstack([self.holdings, np.repeat(last, extra, axis=0)])
+        self.cash = np.concatenate([self.cash, np.full(extra, self.cash[-1] if len(self.cash) else 0.0)])
+        self.prices = np.vstack([self.prices, np.full((extra, len(self.assets)), np.nan)])
+
+    def _trim(self, now: datetime):
+        """Drop rows older than HISTORY_DAYS; rows are cumulative, so nothing else changes."""
+        drop = self._row(now - timedelta(days=HISTORY_DAYS))
+        if drop > 0:
+            self.holdings, self.cash, self.prices = self.holdings[drop:], self.cash[drop:], self.prices[drop:]
+            self.origin += timedelta(seconds=self.width * drop)
+            self.priced = max(self.priced - drop, 0)
+
+    def _asset(self, symbol: str) -> int:
+        col = self._col.get(symbol)
+        if col is None:
+            col = self._col[symbol] = len(self.assets)
+            self.assets.append(symbol)
+            self.holdings = np.hstack([self.holdings, np.zeros((len(self.cash), 1))])
+            self.prices = np.hstack([self.prices, np.full((len(self.cash), 1), np.nan)])
+            self.priced = 0         # its closes have to be read for every row
+        return col
+
+    def apply(self, symbol: Optional[str], side: Optional[str], amount: Optional[float],
+              price: Optional[float], ts: Optional[datetime]):
+        """One trade: shift the holdings from its bucket on. O(1) for the newest bucket."""
+        if not symbol or ts is None or amount is None or side not in ("BUY", "SELL"):
+            return
+        signed = amount if side == "BUY" else -amount
+        col = self._asset(symbol.upper())
+        row = max(self._row(ts), 0)
+        self._grow(row + 1)
+        self.holdings[row:, col] += signed
+        if price is not None:
+            self.cash[row:] -= signed * price
+        self.trades += 1
+
+    async def refresh(self, session: AsyncSession, currencies: List[str], now: Optional[datetime] = None):
+        """Fold in new trades and (re)read the closes of the open buckets, up to `now`."""
+        async with self._lock:
+            t0 = time.perf_counter()
+            now = now or datetime.utcnow()
+            if self.origin is None:
+                self.origin = crud.floor_bucket(now - timedelta(days=HISTORY_DAYS), self.width)
+            self._trim(now)
+            self._grow(self._row(now) + 1)
+
+            stmt = select(*crud.TRADE_COLUMNS).order_by(Trade.id)
+            if self.cursor is not None:
+                stmt = stmt.where(Trade.id > self.cursor)
+            rows = (await session.execute(stmt)).all()
+            for tid, symbol, side, amount, price, ts in rows:
+                self.apply(symbol, side, amount, price, ts)
+                self.cursor = tid
+            if self.cursor is None:
+                self.cursor = 0
+            for c in currencies:
+                if c != "USDC":
+                    self._asset(c)
+
+            start = min(self.priced, len(self.cash) - 1)
+            since = self.origin + timedelta(seconds=self.width * start)
+            ticks = crud.ticks_since(None, since, *self.rollups.source_for(self.width))
+            closes = np.full((len(self.cash) - start, len(self.assets)), np.nan)
+            bars = (await session.execute(crud.aggregate_ticks(ticks, self.width))).all()
+            for symbol, bucket, _o, _h, _l, close, _n in bars:
+                col = self._col.get(symbol)
+                row = self._row(bucket) - start
+                if col is not None and 0 <= row < len(closes):
+                    closes[row, col] = float(close)
+            seed = self.prices[start - 1:start] if start > 0 else None
+            self.prices[start:] = _ffill(closes, seed)
+            # the newest bucket is still open: read it again next time
+            self.priced = len(self.cash) - 1
+            self.last_refresh = {
+                "at": now.isoformat(), "trades": len(rows), "buckets_priced": len(closes),
+                "seconds": round(time.perf_counter() - t0, 3),
+            }
+
+    def curve(self, balances: Mapping[str, float], since: datetime) -> Dict[str, np.ndarray]:
+        """Columns from the bucket holding `since` on: bucket start, total, USDC and coin value, anchored on `balances`."""
+        first = max(self._row(since), 0)
+        held = self.holdings[first:]
+        offset = np.array([balances.get(a, 0.0) for a in self.assets]) - self.holdings[-1]
+        value = np.nansum((held + offset) * self.prices[first:], axis=1)
+        cash = self.cash[first:] + (balances.get("USDC", 0.0) - self.cash[-1])
+        start = self.origin + timedelta(seconds=self.width * first)
+        return {
+            "t": np.array([start + timedelta(seconds=self.width * i) for i in range(len(cash))]),
+            "total": cash + value,
+            "usdc": cash,
+            "coins": value,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "bucket_seconds": self.width,
+            "origin": self.origin.isoformat() if self.origin else None,
+            "buckets": len(self.cash),
+            "assets": len(self.assets),
+            "cursor": self.cursor,
+            "trades_replayed": self.trades,
+            "last_refresh": self.last_refresh,
+        }
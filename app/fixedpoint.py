@@ -0,0 +1,158 @@
+"""
+Exact decimal arithmetic over NumPy arrays.
+
+A column of Decimals is held the way Decimal stores each value: an int64
+coefficient and exponent (value = m * 10**e). Addition, multiplication,
+division by 100 and rounding to 2 places reproduce Decimal's result digit
+for digit, including the exponent that decides how str() prints it, as long
+as coefficients stay below LIMIT. Entries that would not fit (or that
+Decimal would print as -0) are flagged not `ok` so callers can redo them
+with Decimal.
+"""
+from decimal import Decimal
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+
+LIMIT = 10 ** 17                      # coefficient bound, far inside int64 and Decimal's 28 digits
+_POW10 = np.array([10 ** i for i in range(19)], dtype=np.int64)
+
+class Column(NamedTuple):
+    m: np.ndarray      # int64 coefficients
+    e: np.ndarray      # int64 exponents
+    has: np.ndarray    # value present (not None)
+    ok: np.ndarray     # exact so far
+
+def column(values: Sequence[Optional[Decimal]]) -> Column:
+    n = len(values)
+    m, e = np.zeros(n, np.int64), np.zeros(n, np.int64)
+    has, ok = np.zeros(n, bool), np.ones(n, bool)
+    for i, v in enumerate(values):
+        if v is None:
+            continue
+        has[i] = True
+        if not v.is_finite():
+            ok[i] = False
+            continue
+        text = str(v)
+        if "E" in text:
+            exp = v.as_tuple().exponent
+            c = int(v.scaleb(-exp))
+        else:
+            head, _, frac = text.partition(".")
+            c, exp = int(head + frac), -len(frac)
+        if abs(c) >= LIMIT or (c == 0 and v.is_signed()):
+            ok[i] = False
+            continue
+        m[i], e[i] = c, exp
+    return Column(m, e, has, ok)
+
+def constant(value: Decimal, n: int) -> Column:
+    one = column([value])
+    return Column(*(np.repeat(a, n) for a in one))
+
+def _fits(m: np.ndarray, factor) -> np.ndarray:
+    # checked in float64 first so the int64 product can't wrap
+    return np.abs(m.astype(np.float64) * factor) < LIMIT
+
+def mul(a: Column, b: Column) -> Column:
+    safe = _fits(a.m, b.m)
+    m = np.where(safe, a.m, 0) * np.where(safe, b.m, 0)
+    return Column(m, a.e + b.e, a.has & b.has, a.ok & b.ok & safe)
+
+def _rescale(a: Column, e: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    shift = a.e - e
+    safe = shift < len(_POW10)
+    p = _POW10[np.where(safe, shift, 0)]
+    safe &= _fits(a.m, p)
+    return np.where(safe, a.m, 0) * np.where(safe, p, 1), safe
+
+def add(a: Column, b: Column) -> Column:
+    e = np.minimum(a.e, b.e)
+    ma, sa = _rescale(a, e)
+    mb, sb = _rescale(b, e)
+    m = ma + mb
+    return Column(m, e, a.has & b.has, a.ok & b.ok & sa & sb & (np.abs(m) < LIMIT))
+
+def neg(a: Column) -> Column:
+    return Column(-a.m, a.e, a.has, a.ok)
+
+def sub(a: Column, b: Column) -> Column:
+    return add(a, neg(b))
+
+def div100(a: Column) -> Column:
+    # Decimal keeps the exact quotient at the exponent closest to the dividend's:
+    # drop up to two trailing zeros instead of shifting the exponent by 2
+    k = np.where(a.m % 100 == 0, 2, np.where(a.m % 10 == 0, 1, 0))
+    return Column(a.m // _POW10[k], a.e - 2 + k, a.has, a.ok)
+
+def where(mask: np.ndarray, a: Column, b: Column) -> Column:
+    return Column(*(np.where(mask, x, y) for x, y in zip(a, b)))
+
+def total(a: Column) -> Column:
+    """Sum of the present entries, as `D("0") + x0 + x1 + ...` would give it (length-1 column)."""
+    e = np.array([min(0, int(a.e[a.has].min()) if a.has.any() else 0)], np.int64)
+    ms, safe = _rescale(Column(a.m[a.has], a.e[a.has], a.has[a.has], a.ok[a.has]), np.repeat(e, int(a.has.sum())))
+    ok = bool(a.ok[a.has].all() and safe.all() and np.abs(ms.astype(np.float64)).sum() < LIMIT)
+    return Column(np.array([ms.sum() if ok else 0], np.int64), e, np.ones(1, bool), np.array([ok]))
+
+def pct_change(a: Column, b: Column) -> Column:
+    """((a / b) - 1) * 100 quantized to 0.01 with ROUND_HALF_EVEN; needs b > 0."""
+    e = np.minimum(a.e, b.e)
+    p, sp = _rescale(a, e)
+    r, sr = _rescale(b, e)
+    diff = p - r
+    safe = sp & sr & (r > 0) & _fits(diff, 10 ** 4)
+    num = np.where(safe, diff, 0) * 10 ** 4
+    den = np.where(safe, r, 1)
+    q, rem = np.divmod(num, den)
+    q += (2 * rem > den) | ((2 * rem == den) & (q % 2 == 1))
+    # Decimal prints a small negative change as "-0.00"; leave that to the Decimal path
+    safe &= ~((q == 0) & (num < 0))
+    return Column(q, np.full(len(q), -2, np.int64), a.has & b.has, a.ok & b.ok & safe)
+
+def round2_half_up(a: Column) -> Column:
+    """quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)."""
+    up = np.clip(a.e + 2, 0, len(_POW10) - 1)
+    down = np.clip(-2 - a.e, 0, len(_POW10) - 1)
+    exact = a.e >= -2
+    safe = ~exact | ((a.e + 2 < len(_POW10)) & _fits(a.m, _POW10[up]))
+    scaled = np.where(exact & safe, a.m, 0) * _POW10[up]
+    mag = np.abs(a.m)
+    # beyond 18 places the coefficient (< LIMIT) is always under half a cent
+    d = np.where(-2 - a.e < len(_POW10), _POW10[down], LIMIT * 10)
+    q, rem = np.divmod(mag, d)
+    q += 2 * rem >= d
+    rounded = np.where(a.m < 0, -q, q)
+    safe &= exact | ~((rounded == 0) & (a.m < 0))
+    return Column(np.where(exact, scaled, rounded), np.full(len(a.m), -2, np.int64), a.has, a.ok & safe)
+
+def is_zero(a: Column) -> np.ndarray:
+    return a.m == 0
+
+def at_least(a: Column, b: Column) -> Tuple[np.ndarray, np.ndarray]:
+    """(a >= b, exact) elementwise."""
+    d = sub(a, b)
+    return d.m >= 0, d.ok
+
+def to_str(m: int, e: int) -> str:
+    """str(Decimal) of m * 10**e, without building the Decimal (same layout rules as Decimal.__str__)."""
+    digits = str(abs(m))
+    left = e + len(digits)
+    dot = left if e <= 0 and left > -6 else 1
+    if dot <= 0:
+        out = "0." + "0" * -dot + digits
+    elif dot >= len(digits):
+        out = digits + "0" * (dot - len(digits))
+    else:
+        out = digits[:dot] + "." + digits[dot:]
+    if left != dot:
+        out += "E%+d" % (left - dot)
+    return "-" + out if m < 0 else out
+
+def fmt(a: Column, i: int) -> Optional[str]:
+    if not a.has[i]:
+        return None
+    return to_str(int(a.m[i]), int(a.e[i]))
+
+def strings(a: Column) -> List[Optional[str]]:
+    return [to_str(m, e) if h else None for m, e, h in zip(a.m.tolist(), a.e.tolist(), a.has.tolist())]
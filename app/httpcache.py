@@ -0,0 +1,103 @@
+"""
+Conditional GETs for the dashboard API and cache headers for its static assets.
+
+ETags are derived from data watermarks (newest trade id, newest price
+timestamp, digests of balances and trading_state) read with one cheap query
+and shared for `snapshot_ttl` seconds, so an unchanged poll costs at most
+that query and returns 304 before the endpoint does any real work. Under
+coordination only the leader runs the query; followers use the watermarks it
+publishes (see SnapshotCache).
+
+Static assets are referenced from index.html as `/name?v=<content hash>`;
+those URLs are cacheable for a year, everything else revalidates.
+"""
+import hashlib, os, time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+from fastapi import Request, Response
+from starlette.staticfiles import StaticFiles
+
+from .config import get_config
+from .db import ReadSessionLocal
+from .snapshot import SnapshotCache
+from . import crud
+
+@dataclass
+class Watermarks:
+    max_trade_id: Optional[int]
+    latest_price_ts: Optional[datetime]
+    balances: Optional[str]          # md5 of the balances rows
+    state: Optional[str]             # md5 of the trading_state rows
+
+async def load_watermarks() -> Watermarks:
+    async with ReadSessionLocal() as session:
+        row = (await session.execute(crud.watermarks_stmt())).one()
+    return Watermarks(*row)
+
+def encode_watermarks(wm: Watermarks) -> list:
+    return [wm.max_trade_id, wm.latest_price_ts.isoformat() if wm.latest_price_ts else None, wm.balances, wm.state]
+
+def decode_watermarks(v: list) -> Watermarks:
+    return Watermarks(v[0], datetime.fromisoformat(v[1]) if v[1] else None, v[2], v[3])
+
+watermarks = SnapshotCache(load_watermarks, ttl=get_config().monitor.snapshot_ttl, kind="watermarks",
+                           encode=encode_watermarks, decode=decode_watermarks)
+
+def etag(*parts) -> str:
+    # weak: the same entity may be sent gzipped or not
+    return 'W/"' + hashlib.sha1(repr(parts).encode()).hexdigest()[:20] + '"'
+
+def window_epoch(seconds: int = 60) -> int:
+    """Coarse clock for responses over a sliding window ("last 24h"), which change even without new data."""
+    return int(time.time() // seconds)
+
+def conditional(request: Request, response: Response, tag: str) -> Optional[Response]:
+    """A 304 if the client already has `tag`; otherwise tags `response` and returns None."""
+    inm = request.headers.get("if-none-match")
+    if inm and (inm.strip() == "*" or tag in [t.strip() for t in inm.split(",")]):
+        return Response(status_code=304, headers={"ETag": tag, "Cache-Control": "no-cache"})
+    response.headers["ETag"] = tag
+    response.headers["Cache-Control"] = "no-cache"
+    return None
+
+def with_cache_headers(response: Response, returned: Response) -> Response:
+    """Endpoints that return a Response themselves bypass the injected one; carry its ETag over."""
+    for name in ("ETag", "Cache-Control"):
+        if name in response.headers:
+            returned.headers[name] = response.headers[name]
+    return returned
+
+# --- static assets ---
+STATIC_DIR = "app/static"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+def _asset_versions(directory: str) -> Dict[str, str]:
+    out = {}
+    for name in os.listdir(directory):
+        if name.endswith((".js", ".css")):
+            with open(os.path.join(directory, name), "rb") as f:
+                out[name] = hashlib.sha256(f.read()).hexdigest()[:12]
+    return out
+
+asset_versions = _asset_versions(STATIC_DIR)
+
+def render_index() -> str:
+    """index.html with local script/stylesheet URLs pinned to their content hash."""
+    with open(os.path.join(STATIC_DIR, "index.html"), encoding="utf-8") as f:
+        html = f.read()
+    for name, version in asset_versions.items():
+        html = html.replace(f'"/{name}"', f'"/{name}?v={version}"')
+    return html
+
+class VersionedStaticFiles(StaticFiles):
+    """StaticFiles that marks `?v=<current hash>` requests immutable and asks for revalidation otherwise."""
+    async def get_response(self, path: str, scope) -> Response:
+        response = await super().get_response(path, scope)
+        version = parse_qs(scope.get("query_string", b"").decode()).get("v", [None])[0]
+        if response.status_code in (200, 304) and version is not None and version == asset_versions.get(path):
+            response.headers["Cache-Control"] = IMMUTABLE
+        elif "cache-control" not in response.headers:
+            response.headers["Cache-Control"] = "no-cache"
+        return response
@@ -0,0 +1,87 @@
+"""
+Indexes the monitor's hot queries rely on, and an opt-in EXPLAIN check.
+
+The trader owns the bot schema, so the monitor never creates these itself.
+Print the DDL with `python -m app.indexes` and apply it once:
+
+    python -m app.indexes | psql "$DATABASE_URL"
+"""
+import json, logging
+from datetime import datetime, timedelta
+from typing import Iterator, List, Tuple
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from .config import get_config
+from .db import AsyncSessionLocal
+from .models import PriceHistory, Trade
+from . import crud
+
+log = logging.getLogger(__name__)
+
+# Estimated rows above which a sequential scan is worth a warning
+SEQ_SCAN_ROWS = 10_000
+
+def recommended_indexes():
+    return [idx for model in (Trade, PriceHistory) for idx in sorted(model.__table__.indexes, key=lambda i: i.name)]
+
+def ddl() -> List[str]:
+    dialect = postgresql.dialect()
+    return [
+        str(CreateIndex(idx, if_not_exists=True).compile(dialect=dialect)).replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1) + ";"
+        for idx in recommended_indexes()
+    ]
+
+def hot_queries() -> List[Tuple[str, object]]:
+    cfg = get_config()
+    coins = [s.upper() for s, c in cfg.coins.items() if c.enabled and s.upper() != "USDC"] or ["BTC"]
+    now = datetime.utcnow()
+    return [
+        ("latest prices", crud.latest_prices_stmt(coins)),
+        ("window reference prices", crud.prices_at_or_after_stmt(coins, now - timedelta(hours=24))),
+        ("latest price timestamp", crud.latest_price_ts_stmt()),
+        ("symbols updated last minute", crud.symbols_updated_since_stmt(now - timedelta(seconds=60))),
+        ("last trade", crud.last_trade_stmt()),
+        ("recent trades", crud.trades_stmt(limit=10)),
+        ("recent trades per symbol", crud.trades_stmt(limit=10, symbol=coins[0])),
+        ("trades keyset page", crud.trades_page_stmt(50, before=(now - timedelta(days=30), 0))),
+    ]
+
+def _seq_scans(plan: dict) -> Iterator[Tuple[str, float]]:
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan.get("Relation Name"), plan.get("Plan Rows", 0)
+    for child in plan.get("Plans", []):
+        yield from _seq_scans(child)
+
+async def check_query_plans(session) -> List[dict]:
+    """EXPLAIN every hot query; warn about large sequential scans and return the findings."""
+    dialect = postgresql.dialect()
+    findings = []
+    for name, stmt in hot_queries():
+        sql = str(stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+        try:
+            raw = (await session.execute(text("EXPLAIN (FORMAT JSON) " + sql))).scalar_one()
+        except Exception as e:
+            log.warning("plan check: could not EXPLAIN %s: %s", name, e)
+            await session.rollback()
+            continue
+        plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+        for relation, rows in _seq_scans(plan):
+            if rows >= SEQ_SCAN_ROWS:
+                log.warning("plan check: %s does a sequential scan on %s (~%d rows); see `python -m app.indexes`",
+                            name, relation, rows)
+                findings.append({"query": name, "relation": relation, "rows": rows})
+    if not findings:
+        log.info("plan check: all %d hot queries use indexes", len(hot_queries()))
+    return findings
+
+async def run_plan_check():
+    try:
+        async with AsyncSessionLocal() as session:
+            await check_query_plans(session)
+    except Exception:
+        log.exception("plan check failed")
+
+if __name__ == "__main__":
+    print("\n".join(ddl()))
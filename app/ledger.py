@@ -0,0 +1,109 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Trade
+
+@dataclass
+class Position:
+    """Per-symbol state replayed from `trades`."""
+    buys: List[Tuple[Optional[datetime], Optional[float], Optional[float]]] = field(default_factory=list)  # since last SELL
+    buy_amount: float = 0.0          # sum(amount) over `buys`
+    buy_cost: float = 0.0            # sum(amount * price) over `buys`
+    has_amount: bool = False         # any non-NULL amount (SQL sum() is NULL otherwise)
+    has_cost: bool = False
+    last_sell_ts: Optional[datetime] = None
+    last_sell_price: Optional[float] = None
+    realized_pnl: float = 0.0
+
+    @property
+    def dca(self) -> Optional[float]:
+        # same as sum(amount * price) / nullif(sum(amount), 0), rounded like the SQL path
+        if not (self.has_amount and self.has_cost) or self.buy_amount == 0:
+            return None
+        return round(self.buy_cost / self.buy_amount, 8)
+
+    def _resum(self):
+        self.buy_amount = sum(a for _, a, _ in self.buys if a is not None)
+        self.buy_cost = sum(a * p for _, a, p in self.buys if a is not None and p is not None)
+        self.has_amount = any(a is not None for _, a, _ in self.buys)
+        self.has_cost = any(a is not None and p is not None for _, a, p in self.buys)
+
+    def apply(self, side: Optional[str], amount: Optional[float], price: Optional[float], ts: Optional[datetime]):
+        if side == "BUY":
+            # a BUY only counts if it is newer than the last SELL
+            if self.last_sell_ts is not None and (ts is None or ts <= self.last_sell_ts):
+                return
+            self.buys.append((ts, amount, price))
+            if amount is not None:
+                self.buy_amount += amount
+                self.has_amount = True
+                if price is not None:
+                    self.buy_cost += amount * price
+                    self.has_cost = True
+        elif side == "SELL":
+            if ts is None or (self.last_sell_ts is not None and ts <= self.last_sell_ts):
+                return
+            dca = self.dca
+            if dca is not None and amount is not None and price is not None:
+                self.realized_pnl += (price - dca) * amount
+            self.last_sell_ts = ts
+            self.last_sell_price = price
+            # drop BUYs the new SELL closed (usually all of them)
+            self.buys = [b for b in self.buys if b[0] is not None and b[0] > ts]
+            self._resum()
+
+class PositionLedger:
+    """
+    Weighted-average cost since the last SELL, last SELL price and realized
+    P&L per symbol, kept in memory. `refresh` replays only trades with an id
+    beyond the cursor; the first call replays the whole table.
+    """
+    def __init__(self):
+        self.positions: Dict[str, Position] = {}
+        self.cursor: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, session: AsyncSession) -> int:
+        async with self._lock:
+            stmt = select(Trade.id, Trade.symbol, Trade.side, Trade.amount, Trade.price, Trade.timestamp).order_by(Trade.id)
+            if self.cursor is not None:
+                stmt = stmt.where(Trade.id > self.cursor)
+            res = await session.execute(stmt)
+            n = 0
+            for tid, symbol, side, amount, price, ts in res.all():
+                if symbol:
+                    self.positions.setdefault(symbol, Position()).apply(side, amount, price, ts)
+                self.cursor = tid
+                n += 1
+            if self.cursor is None:
+                self.cursor = 0
+            return n
+
+    def dca(self, symbol: str) -> Optional[float]:
+        pos = self.positions.get(symbol)
+        return pos.dca if pos else None
+
+    def last_sell_price(self, symbol: str) -> Optional[float]:
+        pos = self.positions.get(symbol)
+        return pos.last_sell_price if pos else None
+
+    def stats(self) -> dict:
+        return {
+            "cursor": self.cursor,
+            "positions": {
+                sym: {
+                    "dca": p.dca,
+                    "open_buys": len(p.buys),
+                    "last_sell_price": p.last_sell_price,
+                    "last_sell_ts": p.last_sell_ts.isoformat() if p.last_sell_ts else None,
+                    "realized_pnl": round(p.realized_pnl, 8),
+                }
+                for sym, p in sorted(self.positions.items())
+            },
+        }
+
+ledger = PositionLedger()
@@ -0,0 +1,352 @@
+import asyncio, json, logging, time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from fastapi import WebSocket
+
+from .db import ReadSessionLocal
+from . import crud, metrics
+
+log = logging.getLogger(__name__)
+
+class Client:
+    """One /ws/live socket with its own bounded outbound queue and writer task."""
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.ws = websocket
+        self.symbol: Optional[str] = None          # trades filter (None = all symbols)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.sent = 0
+        self.dropped = 0
+        self.needs_snapshot = True
+        self.inflight_since: Optional[float] = None  # enqueue time of the message being written
+        self.writer: Optional[asyncio.Task] = None
+
+    @property
+    def lag(self) -> float:
+        return (time.monotonic() - self.inflight_since) if self.inflight_since is not None else 0.0
+
+    def info(self) -> dict:
+        peer = self.ws.client
+        return {
+            "peer": f"{peer.host}:{peer.port}" if peer else None,
+            "symbol": self.symbol,
+            "queue_depth": self.queue.qsize(),
+            "lag_seconds": round(self.lag, 3),
+            "sent": self.sent,
+            "dropped": self.dropped,
+        }
+
+class ConnectionManager:
+    """
+    Fan-out to /ws/live sockets. `send_text` only enqueues, so a tick never
+    waits on a socket; each client's writer drains its queue concurrently
+    with the others under a per-send deadline.
+
+    When a client's queue is full, policy "latest" throws away its backlog and
+    keeps only the newest message, policy "evict" closes it. A client whose
+    send misses the deadline is evicted either way.
+    """
+    def __init__(self, queue_size: int = 8, send_timeout: float = 5.0, policy: str = "latest"):
+        self.clients: Dict[WebSocket, Client] = {}
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.policy = policy
+        self.evictions = 0
+        self.dropped = 0
+        self._has_clients = asyncio.Event()
+        self._evicting: set = set()
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        client = Client(websocket, self.queue_size)
+        client.writer = asyncio.create_task(self._writer(client))
+        self.clients[websocket] = client
+        self._has_clients.set()
+
+    def subscribe(self, websocket: WebSocket, symbols: List[str]):
+        # Same rule as the old per-connection loop: a single symbol narrows the trades list
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.symbol = symbols[0] if len(symbols) == 1 else None
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client is not None and client.writer is not None and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+        if not self.clients:
+            self._has_clients.clear()
+
+    def client(self, websocket: WebSocket) -> Optional[Client]:
+        return self.clients.get(websocket)
+
+    async def evict(self, client: Client, reason: str):
+        if self.clients.get(client.ws) is not client:
+            return
+        self.evictions += 1
+        log.warning("evicting live client %s: %s", client.info()["peer"], reason)
+        self.disconnect(client.ws)
+        try:
+            await client.ws.close(code=1013)   # try again later
+        except Exception:
+            pass
+
+    async def wait_for_clients(self):
+        await self._has_clients.wait()
+
+    def groups(self) -> Dict[Optional[str], List[Client]]:
+        out: Dict[Optional[str], List[Client]] = {}
+        for client in self.clients.values():
+            out.setdefault(client.symbol, []).append(client)
+        return out
+
+    def send_text(self, clients: List[Client], text: str):
+        for client in clients:
+            if client.queue.full():
+                if self.policy == "evict":
+                    task = asyncio.create_task(self.evict(client, "queue full"))
+                    self._evicting.add(task)
+                    task.add_done_callback(self._evicting.discard)
+                    continue
+                while not client.queue.empty():
+                    client.queue.get_nowait()
+                    client.dropped += 1
+                    self.dropped += 1
+            client.queue.put_nowait((time.monotonic(), text))
+
+    def broadcast(self, message: dict):
+        self.send_text(list(self.clients.values()), json.dumps(message, default=str))
+
+    async def _writer(self, client: Client):
+        while True:
+            client.inflight_since, text = await client.queue.get()
+            try:
+                await asyncio.wait_for(client.ws.send_text(text), timeout=self.send_timeout)
+            except asyncio.TimeoutError:
+                await self.evict(client, f"send exceeded {self.send_timeout}s")
+                return
+            except Exception:
+                # closed / reset socket: the receive side reports the disconnect
+                self.disconnect(client.ws)
+                return
+            client.sent += 1
+            client.inflight_since = None
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self.clients),
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "send_timeout": self.send_timeout,
+            "evictions": self.evictions,
+            "dropped": self.dropped,
+            "clients": [c.info() for c in self.clients.values()],
+        }
+
+class GroupState:
+    """Last tick sent to one subscription group; deltas are encoded against it."""
+    def __init__(self):
+        self.seq = 0
+        self.status: Optional[dict] = None
+        self.balances: Dict[str, Optional[float]] = {}
+        self.trades: List[dict] = []
+        self.indicators: Dict[str, dict] = {}
+        self._snapshot: Optional[str] = None
+
+    def diff(self, status: dict, balances: Dict[str, Optional[float]], trades: List[dict],
+             indicators: Dict[str, dict]) -> Optional[dict]:
+        """Changes since the last tick, or None when they can't be expressed as a delta."""
+        known = {t["id"] for t in self.trades}
+        new = [t for t in trades if t["id"] not in known]
+        # trades must be the old list with new ids prepended; anything else resends a snapshot
+        if new != trades[:len(new)] or trades[len(new):] != self.trades[:len(trades) - len(new)]:
+            return None
+
+        out: dict = {"type": "delta", "seq": self.seq + 1}
+        if status != self.status:
+            out["status"] = status
+        changed = [{"currency": c, "available_balance": v} for c, v in balances.items()
+                   if c not in self.balances or self.balances[c] != v]
+        if changed:
+            out["balances"] = changed
+        removed = [c for c in self.balances if c not in balances]
+        if removed:
+            out["removed_balances"] = removed
+        if new:
+            out["trades"] = new
+        if indicators != self.indicators:
+            out["indicators"] = indicators
+        return out
+
+    def update(self, status: dict, balances: Dict[str, Optional[float]], trades: List[dict],
+               indicators: Dict[str, dict]):
+        self.seq += 1
+        self.status, self.balances, self.trades, self.indicators = status, balances, trades, indicators
+        self._snapshot = None
+
+    def snapshot_text(self) -> str:
+        if self._snapshot is None:
+            self._snapshot = json.dumps({
+                "type": "snapshot",
+                "seq": self.seq,
+                "status": self.status,
+                "balances": [{"currency": c, "available_balance": v} for c, v in self.balances.items()],
+                "trades": self.trades,
+                "indicators": self.indicators,
+            }, default=str)
+        return self._snapshot
+
+class LiveFeed:
+    """
+    Single producer for /ws/live: every `interval` seconds it runs the tick
+    queries once, serializes one message per subscription group and pushes the
+    same text to every socket in that group. Idles while nobody is connected.
+
+    A client first gets a "snapshot" (status, balances, last 10 trades,
+    indicators of its coin or of all coins); after
+    that each tick is a "delta" holding only what changed. Both carry the
+    group's `seq`; a client that sees a gap sends {"resync": true}.
+
+    With a healthy change listener a tick runs when the DB reports a change
+    (or every `heartbeat` seconds); otherwise it polls every `interval`.
+
+    Under worker coordination (app/coord.py) only the leader runs this loop:
+    it also loads the groups followers asked for (`remote_groups`) and hands
+    each tick's inputs to `publish`; followers feed them to `apply`.
+    """
+    def __init__(self, manager: ConnectionManager, interval: float = 2.0, heartbeat: float = 30.0):
+        self.manager = manager
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.listener = None                  # notify.ChangeListener in event-driven mode
+        self.states: Dict[Optional[str], GroupState] = {}
+        self.remote_groups: Set[Optional[str]] = set()
+        self.publish: Optional[Callable[[dict], None]] = None
+        self.indicators: Callable[[Optional[str]], Dict[str, dict]] = lambda symbol: {}
+        self._demand = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="live-feed")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        self._wake.set()
+
+    def set_remote_groups(self, groups: Set[Optional[str]]):
+        self.remote_groups = groups
+        if groups:
+            self._demand.set()
+
+    async def _wait_for_demand(self):
+        # sockets of our own, or groups another worker asked for
+        while not self.manager.clients and not self.remote_groups:
+            self._demand.clear()
+            waiters = [asyncio.ensure_future(self.manager.wait_for_clients()),
+                       asyncio.ensure_future(self._demand.wait())]
+            try:
+                await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for w in waiters:
+                    w.cancel()
+
+    async def _next_tick(self):
+        if self.listener is not None and self.listener.healthy:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.heartbeat)
+            except asyncio.TimeoutError:
+                pass
+        else:
+            await asyncio.sleep(self.interval)
+        self._wake.clear()
+
+    async def _run(self):
+        while True:
+            await self._wait_for_demand()
+            await self._next_tick()
+            groups = self.manager.groups()
+            if not groups and not self.remote_groups:
+                continue
+            try:
+                with metrics.scope("ws_tick"):
+                    await self.tick(groups)
+            except Exception:
+                log.exception("live tick failed")
+
+    def sync(self, client: Client):
+        """Send `client` a full snapshot of its group now, or on the next tick if there is none yet."""
+        state = self.states.get(client.symbol)
+        if state is None or state.seq == 0:
+            client.needs_snapshot = True
+            return
+        client.needs_snapshot = False
+        self.manager.send_text([client], state.snapshot_text())
+
+    async def load(self, symbols) -> Tuple[dict, Dict[str, Optional[float]], Dict[Optional[str], List[dict]]]:
+        """One tick's inputs: status, balances and the last 10 trades of every group in `symbols`."""
+        async with ReadSessionLocal() as session:
+            row = await crud.get_status(session)
+            status = {
+                "active": bool(row.active) if row else False,
+                "last_trade": row.last_trade if row else "No trades yet",
+            }
+            balances = {b.currency: b.available_balance for b in await crud.get_balances(session)}
+            trades = {}
+            for symbol in symbols:
+                trades[symbol] = [{
+                    "id": t.id, "symbol": t.symbol, "side": t.side, "amount": t.amount,
+                    "price": t.price, "timestamp": t.timestamp
+                } for t in await crud.get_trades(session, limit=10, symbol=symbol)]
+        return status, balances, trades
+
+    async def tick(self, groups: Dict[Optional[str], List[Client]]):
+        status, balances, trades = await self.load(set(groups) | self.remote_groups)
+        indicators = {symbol: self.indicators(symbol) for symbol in trades}
+        if self.publish is not None:
+            self.publish({"kind": "live", "status": status, "balances": balances,
+                          "trades": [[symbol, rows] for symbol, rows in trades.items()],
+                          "indicators": [[symbol, ind] for symbol, ind in indicators.items()]})
+        self.fan_out(groups, status, balances, trades, indicators)
+        self.prune(groups)
+
+    def apply(self, msg: dict):
+        """Follower: fan out a tick published by the leader (groups it didn't load wait for the next one)."""
+        trades = {symbol: rows for symbol, rows in msg["trades"]}
+        indicators = {symbol: ind for symbol, ind in msg["indicators"]}
+        groups = self.manager.groups()
+        self.fan_out({s: c for s, c in groups.items() if s in trades}, msg["status"], msg["balances"], trades, indicators)
+        self.prune(groups)
+
+    def fan_out(self, groups: Dict[Optional[str], List[Client]], status: dict,
+                balances: Dict[str, Optional[float]], trades_by_group: Dict[Optional[str], List[dict]],
+                indicators_by_group: Dict[Optional[str], Dict[str, dict]]):
+        for symbol, clients in groups.items():
+            trades = trades_by_group[symbol]
+            indicators = indicators_by_group.get(symbol, {})
+            state = self.states.get(symbol)
+            if state is None:
+                state = self.states[symbol] = GroupState()
+                delta = None
+            else:
+                delta = state.diff(status, balances, trades, indicators)
+            state.update(status, balances, trades, indicators)
+
+            fresh = [c for c in clients if c.needs_snapshot or delta is None]
+            for c in fresh:
+                c.needs_snapshot = False
+            if fresh:
+                self.manager.send_text(fresh, state.snapshot_text())
+            if delta is not None and len(fresh) < len(clients):
+                self.manager.send_text([c for c in clients if c not in fresh], json.dumps(delta, default=str))
+
+    def prune(self, groups):
+        for symbol in list(self.states):
+            if symbol not in groups:
+                del self.states[symbol]
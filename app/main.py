@@ -1,26 +1,167 @@
-import os, asyncio, json
-from typing import Optional, List
-from decimal import Decimal, ROUND_HALF_UP
+import os, asyncio, json, math, time
+from typing import Optional, List, Union
 from functools import lru_cache
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
+import numpy as np
 from pydantic import BaseModel
-from fastapi import FastAPI, Depends, WebSocket, WebSocketDisconnect, Query, Response
+from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect, Query, Request, Response, Header
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from sqlalchemy import select, desc, and_, func, or_
+from fastapi.middleware.gzip import GZipMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
 
 from .config import get_config
-from .models import Balance, PriceHistory, TradingState, BotStatus, Trade, ManualCommand
-from .db import get_session
+from .models import BotStatus, ManualCommand
+from .db import engine, read_engine, get_session, get_read_session, ReadSessionLocal, pool_stats
+from .snapshot import snapshot
+from .badges import compute_badges, compute_portfolio
+from .live import ConnectionManager, LiveFeed
+from .rollups import RollupService
+from .retention import RetentionService, retention_windows
+from .indicators import IndicatorService
+from .equity import EquityCurve
+from .indexes import run_plan_check
+from .notify import ChangeListener, FEED_TABLES, SNAPSHOT_TABLES
+from .stream import StreamHub
+from .coord import Coordinator
+from .metrics import MetricsMiddleware
+from . import metrics
+from .httpcache import watermarks, etag, window_epoch, conditional, with_cache_headers, render_index, VersionedStaticFiles, STATIC_DIR
 from . import crud
+from . import trades
+from . import ticks
+from . import simulate
+from . import sources
 from .schemas import (
-    BalanceOut, BotStatusOut, TradeOut, PriceSeries, PricePoint, TradingStateOut, ManualCommandIn
+    BalanceOut, BotStatusOut, TradeOut, PriceSeries, PricePoint, OhlcPoint, OhlcSeries, TradingStateOut, ManualCommandIn
 )
+from .series import lttb, epoch_ms, columns_from_rows, columnar_response
 
 load_dotenv()
-app = FastAPI(title="CryptoBot Monitor")
+
+mon = get_config().monitor
+manager = ConnectionManager(
+    queue_size=mon.live_queue_size,
+    send_timeout=mon.live_send_timeout,
+    policy=mon.live_slow_policy,
+)
+feed = LiveFeed(manager, interval=mon.live_interval, heartbeat=mon.live_heartbeat)
+
+def _on_db_change(tables: set):
+    # an empty set means the listener went up/down: just re-evaluate the feed's mode
+    if tables & SNAPSHOT_TABLES:
+        snapshot.invalidate()
+        watermarks.invalidate()
+        hub.wake()
+    if tables and coord is not None:
+        coord.publish({"kind": "changed", "tables": sorted(tables)})
+    if not tables or tables & FEED_TABLES:
+        feed.wake()
+
+listener = ChangeListener(get_config().database, _on_db_change, coalesce=mon.live_notify_coalesce,
+                          min_interval=mon.live_notify_min_interval) if mon.live_notify else None
+feed.listener = listener
+rollups = RollupService(interval=mon.rollup_interval, backfill_hours=mon.rollup_backfill_hours,
+                        retention=retention_windows(mon))
+retention = RetentionService(rollups, rollups.retention, interval=mon.retention_interval,
+                             batch_size=mon.retention_batch_size, batch_pause=mon.retention_batch_pause)
+
+indicators = IndicatorService(rollups, interval=mon.indicator_interval, warmup=mon.indicator_warmup,
+                              poll=mon.indicator_poll)
+if mon.indicators_enabled:
+    feed.indicators = indicators.get
+    indicators.on_update = feed.wake
+equity = EquityCurve(rollups, width=mon.equity_bucket)
+
+async def _stream_state():
+    async with ReadSessionLocal() as session:
+        badges = await compute_badges(session, rollup=rollups.window_rollup())
+    return badges, await compute_portfolio()
+
+hub = StreamHub(_stream_state, interval=mon.stream_interval, heartbeat=mon.stream_heartbeat,
+                queue_size=mon.live_queue_size, history=mon.stream_history)
+
+# Query counts / DB time per request and tick, exported at /metrics
+for e in {engine, read_engine}:
+    metrics.install(e, slow_query_ms=mon.slow_query_ms)
+metrics.register_gauge("monitor_ws_connections", "Open /ws/live connections.", lambda: {"": len(manager.clients)})
+metrics.register_gauge("monitor_stream_subscribers", "Open /api/stream responses.", lambda: {"": len(hub.subscribers)})
+metrics.register_gauge("monitor_db_pool_checked_out", "Connections in use per pool.",
+                       lambda: {name: p["checked_out"] for name, p in pool_stats().items() if p}, label="pool")
+
+# Pollers / producers: every worker runs them, or only the elected one under coordination
+async def _start_producers():
+    if coord is not None:
+        # followers serve the snapshot and the ETag watermarks loaded here
+        for cache in (snapshot, watermarks):
+            cache.start(lambda: coord.followers > 0)
+    if listener is not None:
+        listener.start()
+    feed.start()
+    hub.start()
+    if mon.indicators_enabled:
+        indicators.start()
+    if mon.rollups_enabled:
+        rollups.start()
+        if mon.retention_enabled:
+            retention.start()
+
+async def _stop_producers():
+    await retention.stop()
+    await rollups.stop()
+    await indicators.stop()
+    await hub.stop()
+    await feed.stop()
+    if listener is not None:
+        await listener.stop()
+    await watermarks.stop()
+    await snapshot.stop()
+
+coord = Coordinator(get_config().database, mon.coordination_socket, mon.coordination_lock_key,
+                    retry=mon.coordination_retry) if mon.coordination else None
+if coord is not None:
+    coord.on_lead, coord.on_follow = _start_producers, _stop_producers
+    feed.publish = hub.publish = snapshot.publish = watermarks.publish = coord.publish
+    def _on_indicators():
+        coord.publish(indicators.message())
+        feed.wake()
+    indicators.on_update = _on_indicators
+    coord.hello = lambda: [hub.message()] + [m for m in (snapshot.message(), watermarks.message()) if m]
+    coord.state = lambda: [{"kind": "rollups", **rollups.stats()}]
+    coord.demand = lambda: {"live": sorted(manager.groups(), key=lambda s: s or ""), "stream": bool(hub.subscribers)}
+    def _on_demand(demands):
+        feed.set_remote_groups({g for d in demands for g in d.get("live", [])})
+        hub.set_remote_demand(any(d.get("stream") for d in demands))
+    coord.on_demand = _on_demand
+    coord.handlers = {
+        "live": feed.apply,
+        "stream": hub.apply,
+        "rollups": rollups.follow,
+        "indicators": indicators.follow,
+        "snapshot": snapshot.follow,
+        "watermarks": watermarks.follow,
+        "changed": lambda msg: _on_db_change(set(msg["tables"])),
+    }
+    metrics.register_gauge("monitor_leader", "1 on the worker running the pollers.", lambda: {"": int(coord.leader)})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if coord is None:
+        await _start_producers()
+    else:
+        coord.start()
+    if mon.check_query_plans:
+        plan_check = asyncio.create_task(run_plan_check())  # referenced so it is not collected mid-run
+    yield
+    if coord is not None:
+        await coord.stop()
+    await _stop_producers()
+    simulate.shutdown()
+
+app = FastAPI(title="CryptoBot Monitor", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 origins = [o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",")]
 app.add_middleware(
@@ -30,235 +171,57 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-def D(x) -> Decimal:
-    return Decimal(str(x))
-
-async def _latest_price(session: AsyncSession, coin: str) -> Decimal | None:
-    r = await session.execute(
-        select(PriceHistory.price)
-        .where(PriceHistory.symbol == coin)
-        .order_by(desc(PriceHistory.timestamp))
-        .limit(1)
-    )
-    v = r.scalar_one_or_none()
-    return D(v) if v is not None else None
-
-async def _price_at_or_after(session: AsyncSession, coin: str, since: datetime) -> Decimal | None:
-    r = await session.execute(
-        select(PriceHistory.price)
-        .where(and_(PriceHistory.symbol == coin, PriceHistory.timestamp >= since))
-        .order_by(PriceHistory.timestamp)
-        .limit(1)
-    )
-    v = r.scalar_one_or_none()
-    if v is not None:
-        return D(v)
-    r = await session.execute(
-        select(PriceHistory.price)
-        .where(and_(PriceHistory.symbol == coin, PriceHistory.timestamp < since))
-        .order_by(desc(PriceHistory.timestamp))
-        .limit(1)
-    )
-    v = r.scalar_one_or_none()
-    return D(v) if v is not None else None
-
-async def get_weighted_avg_buy_price(session: AsyncSession, symbol: str) -> float | None:
-    """
-    Weighted average BUY price since the last SELL for `symbol`.
-    Returns None if there are no BUYs in scope.
-    """
-    # Subquery: last SELL timestamp for this symbol
-    last_sell_ts_sq = (
-        select(func.max(Trade.timestamp))
-        .where(and_(Trade.symbol == symbol, Trade.side == "SELL"))
-        .scalar_subquery()
-    )
-
-    # WAP = sum(amount * price) / sum(amount) over BUYs after last SELL
-    numerator   = func.sum(Trade.amount * Trade.price)
-    denominator = func.nullif(func.sum(Trade.amount), 0)
-
-    q = (
-        select(numerator / denominator)
-        .where(
-            and_(
-                Trade.symbol == symbol,
-                Trade.side == "BUY",
-                or_(last_sell_ts_sq.is_(None), Trade.timestamp > last_sell_ts_sq),
-            )
-        )
-    )
-
-    val = (await session.execute(q)).scalar_one_or_none()
-    return None if val is None else round(float(val), 8)
-
-async def get_last_sell_price(session: AsyncSession, symbol: str) -> Decimal | None:
-    r = await session.execute(
-        select(Trade.price)
-        .where(and_(Trade.symbol == symbol, Trade.side == "SELL"))
-        .order_by(desc(Trade.timestamp))
-        .limit(1)
-    )
-    v = r.scalar_one_or_none()
-    return D(v) if v is not None else None
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 @app.get("/api/coins/badges")
-async def coins_badges(session: AsyncSession = Depends(get_session), lookback_hours: int = 24):
-    cfg = get_config()
-    enabled = [sym.upper() for sym, c in cfg.coins.items() if c.enabled]
-
-    # balances
-    res = await session.execute(select(Balance))
-    bal = {b.currency.upper(): D(b.available_balance or 0) for b in res.scalars().all()}
-
-    # trading_state: we need both total_profit AND initial_price
-    res = await session.execute(select(TradingState))
-    state_rows = res.scalars().all()
-    profit_map = {row.symbol.upper(): (D(row.total_profit) if row.total_profit is not None else D("0"))
-                  for row in state_rows}
-    initial_map = {row.symbol.upper(): (D(row.initial_price) if row.initial_price is not None else None)
-                   for row in state_rows}
-
-    now = datetime.utcnow()
-    since = now - timedelta(hours=lookback_hours)
-
-    rows = []
-    for coin in enabled:
-        if coin == "USDC":
-            continue
-
-        amount = bal.get(coin, D("0"))
-        price_now = await _latest_price(session, coin)
-        price_ref_window = await _price_at_or_after(session, coin, since)
-
-        # portfolio value & eligibility FIRST (so we can use `eligible` below)
-        position_usdc = (amount * price_now) if (price_now is not None) else None
-        eligible = (position_usdc is not None and position_usdc >= D("1"))
-
-        # DCA & INITIAL
-        dca_avg = await get_weighted_avg_buy_price(session, coin)
-        dca_avg_D = D(dca_avg) if dca_avg is not None else None
-        init_price = initial_map.get(coin)  # from trading_state fetched earlier
-
-        sell_pct = D(cfg.coins[coin].sell_percentage) if coin in cfg.coins else D(cfg.sell_percentage)
-        buy_pct  = D(cfg.coins[coin].buy_percentage)  if coin in cfg.coins else D(cfg.buy_percentage)
-        rebuy_disc = D(cfg.coins[coin].rebuy_discount) if coin in cfg.coins else D("0")
-
-        # STRICT reference: held -> DCA only; unheld -> INITIAL only
-        if eligible:
-            ref_price = dca_avg_D
-            ref_kind = "DCA" if dca_avg_D is not None else None
-        else:
-            ref_price = init_price
-            ref_kind = "INITIAL" if init_price is not None else None
-
-        current_pct_from_ref = None
-        if price_now is not None and ref_price not in (None, D("0")):
-            current_pct_from_ref = ((price_now / ref_price) - D("1")) * D("100")
-
-        # SELL target: only when holding AND we have DCA
-        sell_target = (dca_avg_D * (D("1") + sell_pct / D("100"))) if (eligible and dca_avg_D is not None) else None
-
-        # BUY target: only when NOT holding; base on INITIAL (fallback to current price)
-        base_for_buy = init_price if (not eligible) else None
-        if base_for_buy is None and not eligible:
-            base_for_buy = price_now
-        buy_target = (base_for_buy * (D("1") + buy_pct / D("100"))) if base_for_buy is not None else None
-
-        # Rebuy level:
-        #  - If HOLDING: dip-add below DCA
-        #  - If NOT holding: re-enter below LAST SELL (if it exists)
-        last_sell_price = await get_last_sell_price(session, coin)  # may be None if never sold
-        base_for_rebuy = dca_avg_D if eligible else last_sell_price
-        rebuy_level = (
-            base_for_rebuy * (D("1") - rebuy_disc / D("100"))
-            if base_for_rebuy not in (None, D("0"))
-            else None
-        )
-
-        # 24h change
-        change_24h_pct = None
-        if price_now is not None and price_ref_window not in (None, D("0")):
-            change_24h_pct = ((price_now / price_ref_window) - D("1")) * D("100")
-
-        rows.append({
-            "coin": coin,
-            "amount": str(amount),
-            "price_usdc": str(price_now) if price_now is not None else None,
-            "change_24h_pct": str(change_24h_pct.quantize(D('0.01'))) if change_24h_pct is not None else None,
-
-            "dca_avg": str(dca_avg_D) if dca_avg_D is not None else None,
-            "sell_pct": str(sell_pct),
-            "sell_target": str(sell_target) if sell_target is not None else None,
-            "buy_pct": str(buy_pct),
-            "buy_target": str(buy_target) if buy_target is not None else None,
-            "rebuy_discount": str(rebuy_disc),
-            "rebuy_level": str(rebuy_level) if rebuy_level is not None else None,
-
-            "position_usdc": str(position_usdc) if position_usdc is not None else None,
-            "total_profit": str(profit_map.get(coin, D("0"))),
-
-            "ref_kind": ref_kind,
-            "current_pct_from_ref": str(current_pct_from_ref.quantize(D('0.01'))) if current_pct_from_ref is not None else None,
-
-            "eligible": eligible
-        })
-
-    return {"coins": rows}
+async def coins_badges(request: Request, response: Response,
+                       session: AsyncSession = Depends(get_read_session), lookback_hours: int = 24):
+    if sources.multiple():
+        # watermarks only cover the primary database: merged bodies are not cached
+        return await sources.badges(lookback_hours, rollup=rollups.window_rollup(timedelta(hours=lookback_hours)))
+    wm = await watermarks.get()
+    tag = etag("badges", lookback_hours, wm.max_trade_id, wm.latest_price_ts, wm.balances, wm.state, window_epoch())
+    if (hit := conditional(request, response, tag)) is not None:
+        return hit
+    return await compute_badges(session, lookback_hours, rollup=rollups.window_rollup(timedelta(hours=lookback_hours)))
 
 @app.get("/api/portfolio/summary")
-async def portfolio_summary(session: AsyncSession = Depends(get_session)):
-    cfg = get_config()
-    enabled = [sym.upper() for sym, c in cfg.coins.items() if c.enabled]
-
-    # Balances map
-    res = await session.execute(select(Balance))
-    bal = {b.currency.upper(): D(b.available_balance or 0) for b in res.scalars().all()}
-
-    usdc_available = bal.get("USDC", D("0"))
-
-    # Helper: latest price for COIN (already in USDC)
-    async def latest_usdc_price(coin: str) -> Decimal | None:
-        q = (
-            select(PriceHistory.price)
-            .where(PriceHistory.symbol == coin)
-            .order_by(desc(PriceHistory.timestamp))
-            .limit(1)
-        )
-        r = await session.execute(q)
-        v = r.scalar_one_or_none()
-        return D(v) if v is not None else None
-
-    holdings_value = D("0")
-    breakdown = []
-
-    for coin in enabled:
-        if coin == "USDC":
-            continue
-        amount = bal.get(coin, D("0"))
-        price = await latest_usdc_price(coin)  # 1 COIN = price USDC
-        value = amount * price if (price is not None) else None
-        if value is not None:
-            holdings_value += value
-
-        breakdown.append({
-            "coin": coin,
-            "amount": str(amount),
-            "price_usdc": str(price) if price is not None else None,
-            "value_usdc": str(value) if value is not None else None
-        })
-
-    total = usdc_available + holdings_value
-    q2 = lambda x: str(x.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
-
+async def portfolio_summary(request: Request, response: Response):
+    if sources.multiple():
+        return await sources.portfolio()
+    wm = await watermarks.get()
+    if (hit := conditional(request, response, etag("portfolio", wm.balances, wm.latest_price_ts))) is not None:
+        return hit
+    return await compute_portfolio()
+
+@app.get("/api/portfolio/history")
+async def portfolio_history(request: Request, response: Response,
+                            days: int = Query(30, ge=1, le=365),
+                            max_points: int = Query(500, ge=3, le=10000),
+                            session: AsyncSession = Depends(get_read_session)):
+    wm = await watermarks.get()
+    tag = etag("portfolio_history", days, max_points, wm.max_trade_id, wm.balances, wm.latest_price_ts, window_epoch())
+    if (hit := conditional(request, response, tag)) is not None:
+        return hit
+    snap = await snapshot.get()
+    balances = {c: float(v) for c, v in snap.balances.items()}
+    await equity.refresh(session, list(balances))
+    cols = equity.curve(balances, datetime.utcnow() - timedelta(days=days))
+    keep = lttb(list(enumerate(cols["total"].tolist())), max_points)
     return {
-        "usdc_available": q2(usdc_available),
-        "holdings_value_usdc": q2(holdings_value),
-        "total_usdc": q2(total),
-        "breakdown": breakdown
+        "bucket_seconds": equity.width,
+        "anchored_at": snap.taken_at.isoformat(),
+        "points": [
+            {"timestamp": cols["t"][i].isoformat(), "total_usdc": round(float(cols["total"][i]), 8),
+             "usdc": round(float(cols["usdc"][i]), 8), "coins_usdc": round(float(cols["coins"][i]), 8)}
+            for i in keep
+        ],
     }
 
+@app.get("/api/portfolio/history/stats")
+def portfolio_history_stats():
+    return equity.stats()
+
 class BotStatusOut(BaseModel):
     active: bool
     last_trade: str | None = None
@@ -268,20 +231,15 @@ class BotStatusOut(BaseModel):
     expected_enabled_symbols: int | None = None
 
 @app.get("/api/status", response_model=BotStatusOut)
-async def status(session: AsyncSession = Depends(get_session)):
+async def status():
     now = datetime.utcnow()
-    cutoff = now - timedelta(seconds=60)
+    snap = await snapshot.get()
 
     # latest price update across all symbols
-    q_latest_ts = select(func.max(PriceHistory.timestamp))
-    latest_ts = (await session.execute(q_latest_ts)).scalar_one_or_none()
+    latest_ts = snap.latest_price_ts
 
     # how many distinct symbols updated in the last minute
-    q_distinct = (
-        select(func.count(func.distinct(PriceHistory.symbol)))
-        .where(PriceHistory.timestamp >= cutoff)
-    )
-    updated_symbols = (await session.execute(q_distinct)).scalar_one()
+    updated_symbols = snap.updated_symbols_last_min
 
     # optional: enabled symbol count for context
     cfg = get_config()
@@ -291,12 +249,7 @@ async def status(session: AsyncSession = Depends(get_session)):
     active = (updated_symbols or 0) >= max(1, min(1, enabled_symbols))
 
     # last trade pretty string (latest across all coins)
-    q_last_trade = (
-        select(Trade.symbol, Trade.side, Trade.amount, Trade.price, Trade.timestamp)
-        .order_by(desc(Trade.timestamp))
-        .limit(1)
-    )
-    lt = (await session.execute(q_last_trade)).first()
+    lt = snap.last_trade
     last_trade = None
     if lt:
         sym, side, amt, price, ts = lt
@@ -314,50 +267,233 @@ async def status(session: AsyncSession = Depends(get_session)):
         expected_enabled_symbols=enabled_symbols,
     )
 
+@app.get("/api/positions")
+async def positions():
+    return (await snapshot.get()).ledger
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/db/stats")
+def db_stats():
+    return pool_stats()
+
+@app.get("/api/snapshot/stats")
+def snapshot_stats():
+    return snapshot.stats()
+
 @app.get("/api/balances", response_model=List[BalanceOut])
-async def balances(session: AsyncSession = Depends(get_session)):
+async def balances(request: Request, response: Response, session: AsyncSession = Depends(get_read_session)):
+    wm = await watermarks.get()
+    if (hit := conditional(request, response, etag("balances", wm.balances))) is not None:
+        return hit
     items = await crud.get_balances(session)
     return [BalanceOut(currency=i.currency, available_balance=i.available_balance) for i in items]
 
-def row_to_dict(t: Trade):
-    return {
-        "id": t.id,
-        "symbol": t.symbol,
-        "side": t.side,
-        "amount": float(t.amount) if t.amount is not None else None,
-        "price": float(t.price) if t.price is not None else None,
-        "timestamp": t.timestamp.isoformat() if t.timestamp else None,
-    }
-
 @app.get("/api/trades")
 async def api_trades(
-    session: AsyncSession = Depends(get_session),
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session),
     limit: int = Query(20, ge=1, le=200),
     symbol: str | None = None,
+    side: Optional[str] = Query(None, pattern="^(BUY|SELL)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    before: Optional[str] = Query(None, description="next_cursor of the previous page (older trades)"),
+    after: Optional[str] = Query(None, description="prev_cursor of the previous page (newer trades)"),
 ):
-    q = select(Trade)
-    if symbol:
-        q = q.where(Trade.symbol == symbol.upper())
-    q = q.order_by(desc(Trade.timestamp)).limit(limit)
-
-    res = await session.execute(q)
-    trades = [row_to_dict(t) for t in res.scalars().all()]
-    return {"trades": trades}
-
-@app.get("/api/price_history", response_model=PriceSeries)
+    if before and after:
+        raise HTTPException(400, "pass either before or after, not both")
+    if sources.multiple():
+        try:
+            return await sources.trades_page(limit, symbol=symbol.upper() if symbol else None, side=side,
+                                             since=trades.utc_naive(since), until=trades.utc_naive(until),
+                                             before=before, after=after)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+    wm = await watermarks.get()
+    tag = etag("trades", limit, symbol, side, since, until, before, after, wm.max_trade_id)
+    if (hit := conditional(request, response, tag)) is not None:
+        return hit
+    try:
+        return await trades.page(session, limit, symbol=symbol.upper() if symbol else None, side=side,
+                                 since=trades.utc_naive(since), until=trades.utc_naive(until),
+                                 before=before, after=after)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+@app.get("/api/trades/export")
+async def api_trades_export(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    symbol: Optional[str] = None,
+    side: Optional[str] = Query(None, pattern="^(BUY|SELL)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    body = trades.export(format, symbol=symbol.upper() if symbol else None, side=side,
+                         since=trades.utc_naive(since), until=trades.utc_naive(until))
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="trades.{format}"'})
+
+def _rollup_friendly(seconds: int) -> int:
+    # round a derived bucket up to whole rollup buckets so it can be served from them
+    for width in (3600, 900, 60):
+        if seconds >= width:
+            return math.ceil(seconds / width) * width
+    return seconds
+
+@app.get("/api/price_history", response_model=Union[PriceSeries, OhlcSeries])
 async def price_history(
+    request: Request,
+    response: Response,
     symbol: str,
     hours: int = Query(24, ge=1, le=168),
-    session: AsyncSession = Depends(get_session),
+    resolution: Optional[int] = Query(None, ge=1, description="bucket width in seconds"),
+    max_points: Optional[int] = Query(None, ge=3, le=10000),
+    agg: str = Query("ohlc", pattern="^(ohlc|lttb)$"),
+    format: str = Query("json", pattern="^(json|columnar|binary)$"),
+    session: AsyncSession = Depends(get_read_session),
 ):
-    rows = await crud.get_price_history(session, symbol=symbol, hours=hours)
-    return PriceSeries(
+    wm = await watermarks.get()
+    tag = etag("price_history", symbol, hours, resolution, max_points, agg, format, wm.latest_price_ts, window_epoch())
+    if (hit := conditional(request, response, tag)) is not None:
+        return hit
+    # columnar / binary: epoch-ms + float64 arrays, no per-point objects
+    compact = format != "json"
+
+    # No sizing asked for: raw ticks, as before
+    if resolution is None and max_points is None:
+        if compact:
+            rows = await crud.get_price_columns(session, symbol=symbol, hours=hours)
+            return with_cache_headers(response, columnar_response(symbol, columns_from_rows(rows, ("t", "p"), (np.int64, np.float64)), format))
+        rows = await crud.get_price_history(session, symbol=symbol, hours=hours)
+        return PriceSeries(
+            symbol=symbol,
+            points=[PricePoint(timestamp=r.timestamp, price=float(r.price or 0)) for r in rows]
+        )
+
+    span = hours * 3600
+    if agg == "lttb":
+        rows = await crud.get_price_points(session, symbol=symbol, hours=hours)
+        threshold = max_points or max(3, span // resolution)
+        xy = [((ts - rows[0][0]).total_seconds(), float(p or 0)) for ts, p in rows]
+        keep = lttb(xy, threshold)
+        if compact:
+            kept = [(epoch_ms(rows[i][0]), xy[i][1]) for i in keep]
+            return with_cache_headers(response, columnar_response(symbol, columns_from_rows(kept, ("t", "p"), (np.int64, np.float64)), format))
+        return PriceSeries(
+            symbol=symbol,
+            points=[PricePoint(timestamp=rows[i][0], price=xy[i][1]) for i in keep]
+        )
+
+    # OHLC buckets: at least `resolution` wide and few enough to fit `max_points`
+    bucket = max(resolution or 1, _rollup_friendly(math.ceil(span / max_points)) if max_points else 1)
+    rollup, rollup_until = rollups.source_for(bucket)
+    bars = await crud.get_price_ohlc(session, symbol=symbol, hours=hours, bucket_seconds=bucket,
+                                     rollup=rollup, rollup_until=rollup_until)
+    if compact:
+        rows = [(epoch_ms(b), o, h, l, c, n) for b, o, h, l, c, n in bars]
+        cols = columns_from_rows(rows, ("t", "o", "h", "l", "c", "n"), (np.int64,) + (np.float64,) * 4 + (np.int64,))
+        return with_cache_headers(response, columnar_response(symbol, cols, format, resolution=bucket))
+    return OhlcSeries(
         symbol=symbol,
-        points=[PricePoint(timestamp=r.timestamp, price=float(r.price or 0)) for r in rows]
+        resolution=bucket,
+        points=[OhlcPoint(timestamp=b, open=float(o), high=float(h), low=float(l), close=float(c), count=n, price=float(c))
+                for b, o, h, l, c, n in bars]
     )
 
+@app.get("/api/price_history/export")
+async def price_history_export(
+    format: str = Query("csv", pattern="^(csv|ndjson|columnar)$"),
+    symbol: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    body = ticks.export(format, symbol=symbol.upper() if symbol else None,
+                        since=trades.utc_naive(since), until=trades.utc_naive(until))
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    ext = "csv" if format == "csv" else "ndjson"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="price_history.{ext}"'})
+
+@app.post("/api/price_history/import")
+async def price_history_import(request: Request):
+    if not mon.price_import:
+        raise HTTPException(403, "price import is disabled (monitor.price_import)")
+    result = await ticks.import_csv(request.stream())
+    snapshot.invalidate()
+    watermarks.invalidate()
+    return result
+
+@app.get("/api/simulate")
+async def api_simulate(
+    symbol: str,
+    days: int = Query(30, ge=1, le=365),
+    resolution: int = Query(300, ge=60, description="bucket width in seconds"),
+    buy_pct: Optional[str] = Query(None, description="a,b,c or start:stop:step; default: the coin's config"),
+    sell_pct: Optional[str] = None,
+    rebuy_discount: Optional[str] = None,
+    trail_percent: Optional[str] = None,
+    capital: float = Query(1000.0, gt=0),
+    order: float = Query(100.0, gt=0, description="USDC per buy"),
+    fee: float = Query(0.0, ge=0, lt=100, description="% per side"),
+    top: int = Query(20, ge=1, le=1000),
+    session: AsyncSession = Depends(get_read_session),
+):
+    symbol = symbol.upper()
+    try:
+        grid = simulate.config_grid(get_config(), symbol, (buy_pct, sell_pct, rebuy_discount, trail_percent),
+                                    max_sets=mon.simulate_max_sets)
+    except ValueError as e:
+        raise HTTPException(400, f"bad parameter values: {e}")
+    since = datetime.utcnow() - timedelta(days=days)
+    closes = await simulate.load_closes(session, symbol, since, resolution, *rollups.source_for(resolution))
+    if len(closes) == 0:
+        raise HTTPException(404, f"no prices for {symbol} in the last {days} days")
+    t0 = time.perf_counter()
+    results = await simulate.run(closes, grid, workers=mon.simulate_workers, capital=capital, order=order, fee=fee)
+    return {
+        "symbol": symbol,
+        "closes": len(closes),
+        "resolution": resolution,
+        "parameter_sets": len(grid),
+        "seconds": round(time.perf_counter() - t0, 3),
+        "results": simulate.ranked(grid, results, top),
+    }
+
+@app.get("/api/rollups/stats")
+def rollups_stats():
+    return rollups.stats()
+
+@app.get("/api/indicators")
+def api_indicators(symbol: Optional[str] = None):
+    return {
+        "as_of": indicators.as_of.isoformat() if indicators.as_of else None,
+        "interval": indicators.interval,
+        "coins": indicators.get(symbol.upper() if symbol else None),
+    }
+
+@app.get("/api/indicators/stats")
+def indicators_stats():
+    return indicators.stats()
+
+@app.get("/api/coordination/stats")
+def coordination_stats():
+    return coord.stats() if coord is not None else {"role": "standalone"}
+
+@app.get("/api/retention/stats")
+def retention_stats():
+    return retention.stats()
+
 @app.get("/api/state", response_model=List[TradingStateOut])
-async def state(symbol: Optional[str] = None, session: AsyncSession = Depends(get_session)):
+async def state(request: Request, response: Response,
+                symbol: Optional[str] = None, session: AsyncSession = Depends(get_read_session)):
+    wm = await watermarks.get()
+    if (hit := conditional(request, response, etag("state", symbol, wm.state))) is not None:
+        return hit
     rows = await crud.get_state(session, symbol=symbol)
     return [TradingStateOut(
         symbol=r.symbol,
@@ -395,31 +531,6 @@ async def manual_commands(cmd: ManualCommandIn, session: AsyncSession = Depends(
     await session.commit()
     return {"ok": True, "id": new_id}
 
-# --- WebSocket live feed (polling backend, simple + reliable) ---
-class ConnectionManager:
-    def __init__(self):
-        self.active: list[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active:
-            self.active.remove(websocket)
-
-    async def broadcast(self, message: dict):
-        dead = []
-        for ws in self.active:
-            try:
-                await ws.send_text(json.dumps(message, default=str))
-            except WebSocketDisconnect:
-                dead.append(ws)
-        for d in dead:
-            self.disconnect(d)
-
-manager = ConnectionManager()
-
 @app.get("/api/config/info")
 def config_info(resp: Response):
     cfg = get_config()
@@ -431,40 +542,64 @@ def config_info(resp: Response):
         "coins": coins
     }
 
+# --- WebSocket live feed (one shared producer, see app/live.py) ---
+@app.get("/api/live/stats")
+def live_stats():
+    return {
+        **manager.stats(),
+        "mode": "notify" if listener is not None and listener.healthy else "poll",
+        "listener": listener.stats() if listener is not None else None,
+    }
+
 @app.websocket("/ws/live")
 async def ws_live(websocket: WebSocket):
     await manager.connect(websocket)
     try:
-        # simple handshake: client can send {"subscribe": ["USDC-EUR","BTC-EUR"]}
-        subs: list[str] = []
-        try:
-            init = await asyncio.wait_for(websocket.receive_text(), timeout=2.0)
-            payload = json.loads(init)
-            subs = payload.get("subscribe", [])
-        except Exception:
-            subs = []
-
+        # client can send {"subscribe": ["USDC-EUR","BTC-EUR"]} or {"resync": true} at any time
         while True:
-            await asyncio.sleep(2)
-            # Only fetch minimal stuff for live update
-            async for session in get_session():
-                status = await crud.get_status(session)
-                trades = await crud.get_trades(session, limit=10, symbol=subs[0] if len(subs)==1 else None)
-                balances = await crud.get_balances(session)
-                await manager.broadcast({
-                    "type": "tick",
-                    "status": {
-                        "active": bool(status.active) if status else False,
-                        "last_trade": status.last_trade if status else "No trades yet",
-                    },
-                    "balances": [{"currency": b.currency, "available_balance": b.available_balance} for b in balances],
-                    "trades": [{
-                        "id": t.id, "symbol": t.symbol, "side": t.side, "amount": t.amount,
-                        "price": t.price, "timestamp": t.timestamp
-                    } for t in trades],
-                })
+            try:
+                payload = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            if not isinstance(payload, dict):
+                continue
+            if "subscribe" in payload:
+                manager.subscribe(websocket, payload.get("subscribe") or [])
+            client = manager.client(websocket)
+            if client is not None and ("subscribe" in payload or payload.get("resync")):
+                feed.sync(client)
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
 
-# Serve static dashboard
-app.mount("/", StaticFiles(directory="app/static", html=True), name="static")
+# --- Server-Sent Events: badge / portfolio changes (one shared producer, see app/stream.py) ---
+@app.get("/api/stream")
+async def stream(
+    symbols: Optional[str] = Query(None, description="comma-separated coins, e.g. ETH,XRP"),
+    last_event_id: Optional[int] = Query(None, description="resume point when the client can't send Last-Event-ID"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    wanted = {s.strip().upper() for s in symbols.split(",") if s.strip()} if symbols else None
+    if last_event_id_header and last_event_id_header.strip().isdigit():
+        last_event_id = int(last_event_id_header)
+    sub = hub.subscribe(wanted or None, last_event_id)
+    return StreamingResponse(
+        hub.events(sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/stream/stats")
+def stream_stats():
+    return hub.stats()
+
+# Serve static dashboard; index.html pins asset URLs to their content hash
+_index_html = render_index()
+
+@app.get("/", include_in_schema=False)
+@app.get("/index.html", include_in_schema=False)
+def index():
+    return HTMLResponse(_index_html, headers={"Cache-Control": "no-cache"})
+
+app.mount("/", VersionedStaticFiles(directory=STATIC_DIR, html=True), name="static")
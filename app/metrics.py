@@ -0,0 +1,187 @@
+"""
+Query accounting and Prometheus metrics.
+
+`install(engine)` hooks SQLAlchemy's cursor events so every statement is
+charged to the current scope: an HTTP request (MetricsMiddleware), a live
+feed tick or a stream tick (`with scope("ws_tick"):`). Per-request counts go
+out in a Server-Timing header and, with route latency, WebSocket connection
+counts and broadcast durations, in the text format served at /metrics.
+"""
+import contextvars, logging, time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import event
+
+log = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+class Scope:
+    """Statements run on behalf of one request or tick."""
+    __slots__ = ("name", "queries", "db_seconds", "asgi")
+
+    def __init__(self, name: str, asgi: Optional[dict] = None):
+        self.name = name
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.asgi = asgi           # HTTP scope: the route is only known once routing ran
+
+    def label(self) -> str:
+        return _route_name(self.asgi) if self.asgi is not None else self.name
+
+_current: contextvars.ContextVar[Optional[Scope]] = contextvars.ContextVar("metrics_scope", default=None)
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...]):
+        self.name, self.help, self.buckets = name, help, buckets
+        self.series: Dict[Tuple, List] = {}      # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        s = self.series.get(key)
+        if s is None:
+            s = self.series[key] = [0] * len(self.buckets) + [0.0, 0]
+        i = bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            s[i] += 1
+        s[-2] += value
+        s[-1] += 1
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, s in sorted(self.series.items()):
+            cum = 0
+            for le, n in zip(self.buckets, s):
+                cum += n
+                out.append(f"{self.name}_bucket{_labels(key, le=_num(le))} {cum}")
+            out.append(f"{self.name}_bucket{_labels(key, le='+Inf')} {s[-1]}")
+            out.append(f"{self.name}_sum{_labels(key)} {s[-2]:.6f}")
+            out.append(f"{self.name}_count{_labels(key)} {s[-1]}")
+        return out
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self.series: Dict[Tuple, float] = {}
+
+    def inc(self, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.series[key] = self.series.get(key, 0) + value
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        out += [f"{self.name}{_labels(key)} {_num(v)}" for key, v in sorted(self.series.items())]
+        return out
+
+class Gauge:
+    """Read at scrape time from `fn`, which returns {label value: number} for `label`."""
+    def __init__(self, name: str, help: str, fn: Callable[[], Dict[str, float]], label: Optional[str] = None):
+        self.name, self.help, self.fn, self.label = name, help, fn, label
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for k, v in self.fn().items():
+            key = ((self.label, k),) if self.label else ()   # unlabelled gauges return {"": value}
+            out.append(f"{self.name}{_labels(key)} {_num(v)}")
+        return out
+
+def _num(v) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+def _labels(key: Tuple, **extra) -> str:
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+request_seconds = Histogram("monitor_http_request_duration_seconds", "HTTP request latency by route.", LATENCY_BUCKETS)
+request_queries = Histogram("monitor_db_queries_per_scope", "SQL statements per request / tick.", QUERY_BUCKETS)
+db_seconds = Counter("monitor_db_seconds_total", "Time spent in SQL statements by scope.")
+queries_total = Counter("monitor_db_queries_total", "SQL statements by scope.")
+slow_queries = Counter("monitor_db_slow_queries_total", "Statements over the slow-query threshold by scope.")
+broadcast_seconds = Histogram("monitor_broadcast_duration_seconds", "Duration of one live/stream tick (queries + fan-out).", LATENCY_BUCKETS)
+_metrics: list = [request_seconds, request_queries, queries_total, db_seconds, slow_queries, broadcast_seconds]
+
+def register_gauge(name: str, help: str, fn: Callable[[], Dict[str, float]], label: Optional[str] = None):
+    _metrics.append(Gauge(name, help, fn, label))
+
+def render() -> str:
+    return "\n".join(line for m in _metrics for line in m.render()) + "\n"
+
+def _finish(s: Scope):
+    request_queries.observe(s.queries, scope=s.name)
+    queries_total.inc(s.queries, scope=s.name)
+    db_seconds.inc(s.db_seconds, scope=s.name)
+
+@contextmanager
+def scope(name: str):
+    """Charge the statements run inside the block to `name`, and time the block as a broadcast."""
+    s = Scope(name)
+    token = _current.set(s)
+    t0 = time.perf_counter()
+    try:
+        yield s
+    finally:
+        _current.reset(token)
+        broadcast_seconds.observe(time.perf_counter() - t0, scope=name)
+        _finish(s)
+
+def install(engine, slow_query_ms: float = 0.0):
+    """Hook `engine` (an AsyncEngine or Engine); statements over `slow_query_ms` (if > 0) are logged."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_t0", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_t0"].pop()
+        s = _current.get()
+        if s is not None:
+            s.queries += 1
+            s.db_seconds += elapsed
+        if slow_query_ms > 0 and elapsed * 1000 >= slow_query_ms:
+            name = s.label() if s is not None else "background"
+            slow_queries.inc(scope=name)
+            log.warning("slow query (%.1f ms, %s): %s", elapsed * 1000, name, " ".join(statement.split())[:500])
+
+def _route_name(scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", str(route))
+    return "static" if scope["type"] == "http" else "other"
+
+class MetricsMiddleware:
+    """Opens a query scope per HTTP request; adds Server-Timing and records route latency."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        s = Scope("http", scope)
+        token = _current.set(s)
+        t0 = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total = (time.perf_counter() - t0) * 1000
+                timing = f'db;dur={s.db_seconds * 1000:.1f};desc="{s.queries} queries", app;dur={total:.1f}'
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            s.name = s.label()
+            request_seconds.observe(time.perf_counter() - t0, route=s.name, method=scope["method"], status=str(status))
+            _finish(s)
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Integer, Text, Numeric, Float, TIMESTAMP, Column
+from sqlalchemy import Boolean, Integer, Text, Numeric, Float, TIMESTAMP, Column, Index
 from .db import Base
 
 class Balance(Base):
@@ -27,6 +27,11 @@ class PriceHistory(Base):
     timestamp = Column(TIMESTAMP, primary_key=True)
     price = Column(Numeric, nullable=True)
 
+    __table_args__ = (
+        # /api/status: max(timestamp) and symbols updated in the last minute
+        Index("ix_price_history_timestamp", "timestamp"),
+    )
+
 class Trade(Base):
     __tablename__ = "trades"
     id = Column(Integer, primary_key=True)
@@ -36,9 +41,42 @@ class Trade(Base):
     price = Column(Float, nullable=True)
     timestamp = Column(TIMESTAMP, nullable=True)
 
+    __table_args__ = (
+        # latest trades (live feed per symbol) and /api/trades keyset pages, per symbol and across all symbols
+        Index("ix_trades_symbol_timestamp_id", "symbol", timestamp.desc(), id.desc()),
+        Index("ix_trades_timestamp_id", timestamp.desc(), id.desc()),
+    )
+
 class TradingState(Base):
     __tablename__ = "trading_state"
     symbol = Column(Text, primary_key=True)
     initial_price = Column(Numeric, nullable=True)
     total_trades = Column(Integer, nullable=True)
     total_profit = Column(Numeric, nullable=True)
+
+# --- Monitor-owned rollups of price_history (created by app/rollups.py) ---
+class _PriceRollup:
+    symbol = Column(Text, primary_key=True)
+    bucket = Column(TIMESTAMP, primary_key=True)     # bucket start
+    open = Column(Numeric, nullable=False)
+    high = Column(Numeric, nullable=False)
+    low = Column(Numeric, nullable=False)
+    close = Column(Numeric, nullable=False)
+    count = Column(Integer, nullable=False)
+
+class PriceRollup1m(_PriceRollup, Base):
+    __tablename__ = "price_rollup_1m"
+    width = 60
+
+class PriceRollup15m(_PriceRollup, Base):
+    __tablename__ = "price_rollup_15m"
+    width = 900
+
+class PriceRollup1h(_PriceRollup, Base):
+    __tablename__ = "price_rollup_1h"
+    width = 3600
+
+class RollupState(Base):
+    __tablename__ = "price_rollup_state"
+    name = Column(Text, primary_key=True)            # rollup table name
+    high_water = Column(TIMESTAMP, nullable=False)   # price_history.timestamp folded in so far
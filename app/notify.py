@@ -0,0 +1,136 @@
+"""
+Event-driven live updates via Postgres LISTEN/NOTIFY.
+
+Statement-level triggers on the tables the dashboard watches NOTIFY
+`monitor_<table>`; ChangeListener holds one dedicated asyncpg connection,
+coalesces bursts of notifications and hands the set of changed tables to a
+callback. Install the triggers once with:
+
+    python -m app.notify | psql "$DATABASE_URL"
+"""
+import asyncio, logging
+from typing import Callable, Optional, Set
+import asyncpg
+
+from .config import DatabaseCfg
+
+log = logging.getLogger(__name__)
+
+WATCHED_TABLES = ("trades", "balances", "bot_status", "trading_state")
+# what each change invalidates: the /ws/live tick inputs, and the snapshot / watermarks / stream
+FEED_TABLES = frozenset({"trades", "balances", "bot_status"})
+SNAPSHOT_TABLES = frozenset({"trades", "balances", "trading_state"})
+# price_history changes several times a second; the caches' TTLs and the pollers cover it
+UNWATCHED_TABLES = ("price_history",)
+
+def channel(table: str) -> str:
+    return f"monitor_{table}"
+
+def trigger_ddl() -> str:
+    parts = ["""CREATE OR REPLACE FUNCTION monitor_notify() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+  PERFORM pg_notify('monitor_' || TG_TABLE_NAME, TG_OP);
+  RETURN NULL;
+END $$;"""]
+    for table in WATCHED_TABLES:
+        parts.append(
+            f"CREATE OR REPLACE TRIGGER monitor_notify AFTER INSERT OR UPDATE OR DELETE ON {table} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION monitor_notify();"
+        )
+    for table in UNWATCHED_TABLES:
+        parts.append(f"DROP TRIGGER IF EXISTS monitor_notify ON {table};")
+    return "\n".join(parts)
+
+class ChangeListener:
+    """
+    LISTENs on every watched table's channel. Notifications arriving within
+    `coalesce` seconds of each other are delivered as one `on_change(tables)`
+    call, and deliveries are at least `min_interval` seconds apart. `healthy`
+    is False while disconnected; the callback is also invoked with an empty
+    set whenever that flips, so pollers can switch mode at once.
+    """
+    def __init__(self, db: DatabaseCfg, on_change: Callable[[Set[str]], None],
+                 coalesce: float = 0.25, min_interval: float = 1.0, keepalive: float = 30.0):
+        self.db = db
+        self.on_change = on_change
+        self.coalesce = coalesce
+        self.min_interval = min_interval
+        self.keepalive = keepalive
+        self.healthy = False
+        self.notifications = 0
+        self.reconnects = 0
+        self._pending: Set[str] = set()
+        self._flush: Optional[asyncio.TimerHandle] = None
+        self._delivered_at = float("-inf")
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="change-listener")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _set_healthy(self, healthy: bool):
+        if healthy != self.healthy:
+            self.healthy = healthy
+            log.info("change listener %s", "connected" if healthy else "down, live feed falls back to polling")
+            self.on_change(set())
+
+    def _on_notify(self, conn, pid, chan, payload):
+        self.notifications += 1
+        self._pending.add(chan.removeprefix("monitor_"))
+        if self._flush is None:
+            loop = asyncio.get_running_loop()
+            delay = max(self.coalesce, self._delivered_at + self.min_interval - loop.time())
+            self._flush = loop.call_later(delay, self._deliver)
+
+    def _deliver(self):
+        tables, self._pending, self._flush = self._pending, set(), None
+        self._delivered_at = asyncio.get_running_loop().time()
+        self.on_change(tables)
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(
+                    host=self.db.host, port=self.db.port, user=self.db.user,
+                    password=self.db.password, database=self.db.name,
+                )
+                closed = asyncio.Event()
+                conn.add_termination_listener(lambda _: closed.set())
+                for table in WATCHED_TABLES:
+                    await conn.add_listener(channel(table), self._on_notify)
+                self._set_healthy(True)
+                backoff = 1.0
+                # a silent network drop never terminates the connection: probe it
+                while not closed.is_set():
+                    try:
+                        await asyncio.wait_for(closed.wait(), timeout=self.keepalive)
+                    except asyncio.TimeoutError:
+                        await asyncio.wait_for(conn.execute("SELECT 1"), timeout=self.keepalive)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("change listener error: %s", e)
+            finally:
+                self._set_healthy(False)
+                if conn is not None and not conn.is_closed():
+                    conn.terminate()
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def stats(self) -> dict:
+        return {"healthy": self.healthy, "notifications": self.notifications, "reconnects": self.reconnects}
+
+if __name__ == "__main__":
+    print(trigger_ddl())
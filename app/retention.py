@@ -0,0 +1,151 @@
+"""
+Tiered retention for price_history and its rollups.
+
+Raw ticks are kept `retention_raw_days`, 1-minute bars `retention_1m_days`,
+15-minute bars `retention_15m_days` (0 = forever); hourly bars are never
+removed. Nothing is deleted before the next coarser level has folded it in:
+each cutoff is capped by that level's rollup high-water mark, so the job
+needs `rollups_enabled` and does nothing until the rollups have been built.
+
+Rows go in batches of `retention_batch_size`, each its own short transaction
+with a pause in between, so the trader's inserts never wait long on a lock.
+
+    CONFIG_PATH=.env/config.json python -m app.retention   # rows each tier would remove now
+"""
+import asyncio, logging, time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, func, select, tuple_
+
+from .config import MonitorCfg
+from .db import AsyncSessionLocal
+from .models import PriceHistory, PriceRollup1m, PriceRollup15m, PriceRollup1h
+from .rollups import RollupService
+from . import crud
+
+log = logging.getLogger(__name__)
+
+def retention_windows(mon: MonitorCfg) -> Dict[str, timedelta]:
+    """Table name -> how long its rows are kept; tables kept forever are absent."""
+    days = {
+        PriceHistory.__tablename__: mon.retention_raw_days,
+        PriceRollup1m.__tablename__: mon.retention_1m_days,
+        PriceRollup15m.__tablename__: mon.retention_15m_days,
+    }
+    if not mon.retention_enabled:
+        return {}
+    return {name: timedelta(days=d) for name, d in days.items() if d > 0}
+
+class RetentionService:
+    """
+    Hourly (by default) pass over the tiers: raw ticks are trimmed up to the
+    1m rollup's high-water mark, 1m bars up to the 15m one, 15m bars up to
+    the 1h one, and never past their retention window.
+    """
+    def __init__(self, rollups: RollupService, windows: Dict[str, timedelta], interval: float = 3600.0,
+                 batch_size: int = 5000, batch_pause: float = 0.1):
+        self.rollups = rollups
+        self.windows = windows
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.runs = 0
+        self.last_run: Optional[dict] = None
+        self.removed_total: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="retention")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            if self.rollups.ready:
+                try:
+                    await self.run_once()
+                except Exception:
+                    log.exception("retention pass failed")
+            await asyncio.sleep(self.interval)
+
+    def tiers(self, now: datetime) -> List[Tuple[type, object, Tuple, datetime]]:
+        """(model, timestamp column, key columns, cutoff) per tier that may be trimmed now."""
+        hw = self.rollups.high_water
+        plan = [
+            (PriceHistory, PriceHistory.timestamp, (PriceHistory.symbol, PriceHistory.timestamp), PriceRollup1m),
+            (PriceRollup1m, PriceRollup1m.bucket, (PriceRollup1m.symbol, PriceRollup1m.bucket), PriceRollup15m),
+            (PriceRollup15m, PriceRollup15m.bucket, (PriceRollup15m.symbol, PriceRollup15m.bucket), PriceRollup1h),
+        ]
+        out = []
+        for model, ts, key, folded_into in plan:
+            keep = self.windows.get(model.__tablename__)
+            folded = hw.get(folded_into.__tablename__)
+            if keep is None or folded is None:
+                continue
+            # whole buckets of the next level only, and nothing it hasn't folded in yet
+            width = folded_into.width
+            out.append((model, ts, key, min(crud.floor_bucket(now - keep, width), crud.floor_bucket(folded, width))))
+        return out
+
+    async def _trim(self, model, ts, key, cutoff: datetime) -> int:
+        removed = 0
+        while True:
+            batch = select(*key).where(ts < cutoff).limit(self.batch_size)
+            async with AsyncSessionLocal() as session:
+                n = (await session.execute(delete(model).where(tuple_(*key).in_(batch)))).rowcount
+                await session.commit()
+            removed += n
+            if n < self.batch_size:
+                return removed
+            await asyncio.sleep(self.batch_pause)
+
+    async def run_once(self) -> dict:
+        t0 = time.perf_counter()
+        now = datetime.utcnow()
+        tiers = {}
+        for model, ts, key, cutoff in self.tiers(now):
+            t1 = time.perf_counter()
+            removed = await self._trim(model, ts, key, cutoff)
+            name = model.__tablename__
+            self.removed_total[name] = self.removed_total.get(name, 0) + removed
+            tiers[name] = {"cutoff": cutoff.isoformat(), "removed": removed,
+                           "seconds": round(time.perf_counter() - t1, 3)}
+            if removed:
+                log.info("retention: removed %d rows from %s older than %s in %.1f s",
+                         removed, name, cutoff, time.perf_counter() - t1)
+        self.runs += 1
+        self.last_run = {"at": now.isoformat(), "seconds": round(time.perf_counter() - t0, 3), "tiers": tiers}
+        return self.last_run
+
+    def stats(self) -> dict:
+        return {
+            "windows_days": {k: v.days for k, v in self.windows.items()},
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "removed_total": self.removed_total,
+        }
+
+async def _dry_run():
+    from .config import get_config
+    from .models import RollupState
+    service = RetentionService(RollupService(), retention_windows(get_config().monitor))
+    if not service.windows:
+        print("retention is disabled (monitor.retention_enabled)")
+        return
+    async with AsyncSessionLocal() as session:
+        res = await session.execute(select(RollupState))
+        service.rollups.high_water = {r.name: r.high_water for r in res.scalars().all()}
+        for model, ts, key, cutoff in service.tiers(datetime.utcnow()):
+            n = (await session.execute(select(func.count()).select_from(model).where(ts < cutoff))).scalar_one()
+            print(f"{model.__tablename__}: {n} rows older than {cutoff}")
+
+if __name__ == "__main__":
+    asyncio.run(_dry_run())
@@ -0,0 +1,166 @@
+import asyncio, logging, time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .db import engine, AsyncSessionLocal, Base
+from .models import PriceHistory, PriceRollup1m, PriceRollup15m, PriceRollup1h, RollupState
+from . import crud
+
+log = logging.getLogger(__name__)
+
+# Finest first; each level is built from the one before it (1m from raw ticks)
+LEVELS = [PriceRollup1m, PriceRollup15m, PriceRollup1h]
+OHLC_COLUMNS = ["symbol", "bucket", "open", "high", "low", "close", "count"]
+
+def _source(high_water: Dict[str, datetime], bucket_seconds: int) -> Tuple[Optional[type], Optional[datetime]]:
+    for model in reversed(LEVELS):
+        hw = high_water.get(model.__tablename__)
+        if hw is not None and bucket_seconds % model.width == 0:
+            return model, crud.floor_bucket(hw, model.width)
+    return None, None
+
+class RollupService:
+    """
+    Keeps price_rollup_{1m,15m,1h} up to date from a per-table high-water mark
+    on price_history.timestamp. Each pass recomputes only the buckets from
+    the high-water bucket onwards, so it costs the same after months of data.
+    A first build walks history in `backfill_hours` chunks.
+
+    `retention` maps rollup table names to how long app/retention.py keeps
+    their rows, so point lookups far in the past go to a level that still has them.
+    """
+    def __init__(self, interval: float = 30.0, backfill_hours: int = 24,
+                 retention: Optional[Dict[str, timedelta]] = None):
+        self.interval = interval
+        self.backfill = timedelta(hours=backfill_hours)
+        self.retention = retention or {}
+        self.high_water: Dict[str, datetime] = {}
+        self.ready = False
+        self.last_run_seconds: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="rollups")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all,
+                                    tables=[m.__table__ for m in LEVELS] + [RollupState.__table__])
+            async with AsyncSessionLocal() as session:
+                res = await session.execute(select(RollupState))
+                self.high_water = {r.name: r.high_water for r in res.scalars().all()}
+        except Exception:
+            log.warning("price rollups disabled: could not create/read rollup tables", exc_info=True)
+            return
+
+        while True:
+            try:
+                t0 = time.monotonic()
+                await self.refresh()
+                self.last_run_seconds = time.monotonic() - t0
+                self.ready = True
+            except Exception:
+                log.exception("price rollup refresh failed")
+            await asyncio.sleep(self.interval)
+
+    async def refresh(self):
+        async with AsyncSessionLocal() as session:
+            # re-read: a price import (app/ticks.py) may have moved the marks back
+            res = await session.execute(select(RollupState))
+            self.high_water = {r.name: r.high_water for r in res.scalars().all()}
+            newest = (await session.execute(select(func.max(PriceHistory.timestamp)))).scalar_one_or_none()
+            if newest is None:
+                return
+
+            m = PriceRollup1m
+            hw = self.high_water.get(m.__tablename__)
+            if hw is None:
+                oldest = (await session.execute(select(func.min(PriceHistory.timestamp)))).scalar_one()
+                start = crud.floor_bucket(oldest, 3600)
+            else:
+                start = crud.floor_bucket(hw, m.width)
+            # catch up in chunks; the last chunk is open-ended so nothing newer than `newest` is lost
+            end = start + self.backfill if newest - start > self.backfill else None
+            await self._upsert(session, m, crud.raw_ticks(None, start, end))
+            source_hw = end or newest
+            await self._set_high_water(session, m, source_hw)
+
+            for source, level in zip(LEVELS, LEVELS[1:]):
+                hw = self.high_water.get(level.__tablename__)
+                # a level built for the first time folds in everything its source has
+                start = crud.floor_bucket(hw, level.width) if hw else crud.BUCKET_ORIGIN
+                await self._upsert(session, level, crud.rollup_ticks(source, None, start))
+                await self._set_high_water(session, level, source_hw)
+
+            await session.commit()
+
+    async def _upsert(self, session, model, ticks):
+        agg = crud.aggregate_ticks(ticks, model.width)
+        stmt = pg_insert(model).from_select(OHLC_COLUMNS, agg)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["symbol", "bucket"],
+            set_={c: stmt.excluded[c] for c in OHLC_COLUMNS[2:]},
+        )
+        await session.execute(stmt)
+
+    async def _set_high_water(self, session, model, hw: datetime):
+        stmt = pg_insert(RollupState).values(name=model.__tablename__, high_water=hw)
+        stmt = stmt.on_conflict_do_update(index_elements=["name"], set_={"high_water": stmt.excluded.high_water})
+        await session.execute(stmt)
+        self.high_water[model.__tablename__] = hw
+
+    def source_for(self, bucket_seconds: int) -> Tuple[Optional[type], Optional[datetime]]:
+        """Coarsest rollup whose buckets tile `bucket_seconds`, and where its complete buckets end."""
+        if not self.ready:
+            return None, None
+        return _source(self.high_water, bucket_seconds)
+
+    async def stored_source_for(self, bucket_seconds: int) -> Tuple[Optional[type], Optional[datetime]]:
+        """
+        source_for without waiting for the first refresh: before it, the
+        marks a previous run left in rollup_state (rows below them are complete).
+        """
+        if self.ready:
+            return self.source_for(bucket_seconds)
+        try:
+            async with AsyncSessionLocal() as session:
+                res = await session.execute(select(RollupState))
+                marks = {r.name: r.high_water for r in res.scalars().all()}
+        except Exception:
+            return None, None     # no rollup tables yet
+        return _source(marks, bucket_seconds)
+
+    def window_rollup(self, lookback: timedelta = timedelta(hours=24)):
+        """The finest built rollup still holding rows `lookback` ago, for point lookups."""
+        if not self.ready:
+            return None
+        for model in LEVELS:
+            keep = self.retention.get(model.__tablename__)
+            if model.__tablename__ in self.high_water and (keep is None or lookback < keep):
+                return model
+        return None
+
+    def follow(self, state: dict):
+        """Adopt another worker's progress (its stats()) when that worker runs the refreshes."""
+        self.ready = state["ready"]
+        self.high_water = {k: datetime.fromisoformat(v) for k, v in state["high_water"].items()}
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "high_water": {k: v.isoformat() for k, v in self.high_water.items()},
+            "last_run_seconds": self.last_run_seconds,
+        }
@@ -27,6 +27,20 @@ class PriceSeries(BaseModel):
     symbol: str
     points: List[PricePoint]
 
+class OhlcPoint(BaseModel):
+    timestamp: datetime          # bucket start
+    open: float
+    high: float
+    low: float
+    close: float
+    count: int
+    price: float                 # = close, so line charts can treat bars like points
+
+class OhlcSeries(BaseModel):
+    symbol: str
+    resolution: int              # bucket width in seconds
+    points: List[OhlcPoint]
+
 class TradingStateOut(BaseModel):
     symbol: str
     initial_price: Optional[float] = None
@@ -0,0 +1,64 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+import orjson
+from fastapi import Response
+
+def lttb(points: Sequence[Tuple[float, float]], threshold: int) -> List[int]:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    `points` are (x, y) pairs sorted by x; returns the indexes of the kept points.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    keep = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # average of the next bucket is the third triangle vertex
+        nxt_start = int((i + 1) * every) + 1
+        nxt_end = min(int((i + 2) * every) + 1, n)
+        span = nxt_end - nxt_start
+        avg_x = sum(points[j][0] for j in range(nxt_start, nxt_end)) / span
+        avg_y = sum(points[j][1] for j in range(nxt_start, nxt_end)) / span
+
+        ax, ay = points[a]
+        best, best_area = -1, -1.0
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        keep.append(best)
+        a = best
+    keep.append(n - 1)
+    return keep
+
+def epoch_ms(ts: datetime) -> int:
+    # price_history timestamps are naive UTC
+    return int(ts.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+def columns_from_rows(rows: Sequence[Tuple], names: Sequence[str], dtypes: Sequence) -> Dict[str, np.ndarray]:
+    """Transpose row tuples into one typed NumPy column per name."""
+    n = len(rows)
+    return {
+        name: np.fromiter((r[i] for r in rows), dtype=dtype, count=n)
+        for i, (name, dtype) in enumerate(zip(names, dtypes))
+    }
+
+def columnar_response(symbol: str, columns: Dict[str, np.ndarray], fmt: str, **meta) -> Response:
+    """
+    fmt "columnar": {"symbol", **meta, "columns": {name: [...]}} encoded by orjson straight from the arrays.
+    fmt "binary":   the columns back to back, little-endian (int64 / float64);
+                    names in X-Columns, row count in X-Rows.
+    """
+    if fmt == "binary":
+        body = b"".join(col.astype(col.dtype.newbyteorder("<"), copy=False).tobytes() for col in columns.values())
+        rows = len(next(iter(columns.values()))) if columns else 0
+        headers = {"X-Columns": ",".join(columns), "X-Rows": str(rows)}
+        headers.update({f"X-{k.replace('_', '-').title()}": str(v) for k, v in meta.items()})
+        return Response(body, media_type="application/octet-stream", headers=headers)
+    body = orjson.dumps({"symbol": symbol, **meta, "columns": columns}, option=orjson.OPT_SERIALIZE_NUMPY)
+    return Response(body, media_type="application/json")
@@ -0,0 +1,286 @@
+"""
+What-if replay of the badge thresholds over stored prices, for tuning
+`buy_percentage`, `sell_percentage`, `rebuy_discount` and `trail_percent`.
+
+Each parameter set trades one coin on the closes of `resolution`-second
+buckets with the levels the badges show:
+
+- flat, never sold: buy when the price falls to the buy target, the first
+  close (standing in for trading_state.initial_price) * (1 + buy_percentage/100)
+- flat after a sell: buy when it falls to the rebuy level, last sell * (1 - rebuy_discount/100)
+- holding: add another order at the rebuy level below the DCA, and arm the
+  sell at DCA * (1 + sell_percentage/100); an armed sell closes the whole
+  position once the price is trail_percent below the highest close since
+  (trail_percent 0 sells at the target)
+
+Every buy spends `order` USDC out of `capital` while the cash lasts, and
+`fee` (in %) is taken from both sides. The state of the whole grid is a set
+of NumPy vectors advanced one close at a time; the grid is split into chunks
+that run in a process pool.
+
+    CONFIG_PATH=.env/config.json python -m app.simulate ETH --days 90 --buy-pct=-1:-6:-1 --sell-pct 1:6:1 --rebuy 1,2,3 --trail 0,0.5,1
+    CONFIG_PATH=.env/config.json python -m app.simulate --check   # vectorized grid vs one-at-a-time reference
+"""
+import asyncio, itertools, math, multiprocessing, os, time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud
+
+PARAMS = ("buy_percentage", "sell_percentage", "rebuy_discount", "trail_percent")
+RESULTS = ("final_usdc", "return_pct", "max_drawdown_pct", "buys", "sells", "realized_usdc", "holding")
+MAX_VALUES = 1000           # per parameter, before the grid size limit applies
+MIN_CHUNK = 64              # parameter sets per process; smaller chunks cost more in overhead than they save
+
+def parse_values(spec: str) -> List[float]:
+    """"a,b,c" or "start:stop:step" (stop excluded, like range) -> values."""
+    if ":" in spec:
+        start, stop, step = (float(x) for x in spec.split(":"))
+        if step == 0 or (stop - start) / step > MAX_VALUES:
+            raise ValueError(f"zero step or more than {MAX_VALUES} values in {spec!r}")
+        return [round(v, 10) for v in np.arange(start, stop, step)]
+    values = [x for x in spec.split(",") if x.strip()]
+    if len(values) > MAX_VALUES:
+        raise ValueError(f"more than {MAX_VALUES} values in {spec[:40]!r}...")
+    return [float(x) for x in values]
+
+def make_grid(buy: Sequence[float], sell: Sequence[float], rebuy: Sequence[float], trail: Sequence[float]) -> np.ndarray:
+    """Every combination, one row per parameter set, columns in PARAMS order."""
+    return np.array(list(itertools.product(buy, sell, rebuy, trail)), dtype=np.float64).reshape(-1, len(PARAMS))
+
+def config_grid(cfg, symbol: str, specs: Sequence[Optional[str]], max_sets: Optional[int] = None) -> np.ndarray:
+    """
+    Grid from one value spec per PARAMS entry; a missing spec is the coin's configured value.
+    ValueError when it would be empty or hold more than `max_sets` rows, before any is built.
+    """
+    coin = cfg.coins.get(symbol) or cfg.coins.get(symbol.lower())
+    defaults = (
+        coin.buy_percentage if coin else cfg.buy_percentage,
+        coin.sell_percentage if coin else cfg.sell_percentage,
+        coin.rebuy_discount if coin else 0.0,
+        coin.trail_percent if coin else cfg.trail_percent,
+    )
+    values = [parse_values(spec) if spec else [default] for spec, default in zip(specs, defaults)]
+    sets = math.prod(len(v) for v in values)
+    if sets == 0:
+        raise ValueError("grid has no parameter sets")
+    if max_sets is not None and sets > max_sets:
+        raise ValueError(f"grid has {sets} parameter sets; at most {max_sets} allowed (monitor.simulate_max_sets)")
+    return make_grid(*values)
+
+def simulate_grid(closes: np.ndarray, grid: np.ndarray, capital: float = 1000.0, order: float = 100.0,
+                  fee: float = 0.0) -> np.ndarray:
+    """Replay `closes` for every row of `grid`; one row of RESULTS per parameter set."""
+    n = len(grid)
+    buy_f = 1 + grid[:, 0] / 100
+    sell_f = 1 + grid[:, 1] / 100
+    rebuy_f = 1 - grid[:, 2] / 100
+    trail_f = 1 - grid[:, 3] / 100
+    keep = 1 - fee / 100
+    entry = closes[0] * buy_f
+
+    cash = np.full(n, capital)
+    qty = np.zeros(n)
+    cost = np.zeros(n)
+    realized = np.zeros(n)
+    last_sell = np.full(n, np.nan)
+    peak = np.full(n, np.nan)             # highest close since the sell was armed
+    buys = np.zeros(n, dtype=np.int64)
+    sells = np.zeros(n, dtype=np.int64)
+    eq_peak = np.full(n, capital)
+    drawdown = np.zeros(n)
+    dca = np.zeros(n)
+
+    for x in closes:
+        held = qty > 0
+        np.divide(cost, qty, out=dca, where=held)
+
+        # sell: arm at the target, then trail the highest close
+        armed = held & (x >= dca * sell_f)
+        peak = np.where(armed, np.fmax(peak, x), peak)
+        sell = held & (x <= peak * trail_f)
+        if sell.any():
+            proceeds = qty * x * keep
+            cash = np.where(sell, cash + proceeds, cash)
+            realized = np.where(sell, realized + proceeds - cost, realized)
+            last_sell = np.where(sell, x, last_sell)
+            qty = np.where(sell, 0.0, qty)
+            cost = np.where(sell, 0.0, cost)
+            peak = np.where(sell, np.nan, peak)
+            sells += sell
+            held &= ~sell
+
+        # buy: buy target before the first sell, rebuy level below the last sell or the DCA
+        level = np.where(held, dca * rebuy_f, np.where(np.isnan(last_sell), entry, last_sell * rebuy_f))
+        buy = (x <= level) & (cash >= order)
+        if buy.any():
+            qty = np.where(buy, qty + order * keep / x, qty)
+            cost = np.where(buy, cost + order, cost)
+            cash = np.where(buy, cash - order, cash)
+            peak = np.where(buy, np.nan, peak)
+            buys += buy
+
+        equity = cash + qty * x
+        np.fmax(eq_peak, equity, out=eq_peak)
+        np.fmax(drawdown, 1 - equity / eq_peak, out=drawdown)
+
+    final = cash + qty * closes[-1]
+    return np.column_stack([final, (final / capital - 1) * 100, drawdown * 100, buys, sells, realized, qty > 0])
+
+def simulate_one(closes: Sequence[float], params: Sequence[float], capital: float = 1000.0, order: float = 100.0,
+                 fee: float = 0.0) -> List[float]:
+    """Reference: the same rules for one parameter set, a plain loop over floats."""
+    buy_pct, sell_pct, rebuy, trail = params
+    keep = 1 - fee / 100
+    entry = closes[0] * (1 + buy_pct / 100)
+    cash, qty, cost, realized = capital, 0.0, 0.0, 0.0
+    last_sell = peak = None
+    buys = sells = 0
+    eq_peak, drawdown = capital, 0.0
+    for x in closes:
+        held = qty > 0
+        dca = cost / qty if held else 0.0
+        if held and x >= dca * (1 + sell_pct / 100):
+            peak = x if peak is None else max(peak, x)
+        if held and peak is not None and x <= peak * (1 - trail / 100):
+            proceeds = qty * x * keep
+            cash += proceeds
+            realized += proceeds - cost
+            last_sell, qty, cost, peak = x, 0.0, 0.0, None
+            sells += 1
+            held = False
+        if held:
+            level = dca * (1 - rebuy / 100)
+        else:
+            level = entry if last_sell is None else last_sell * (1 - rebuy / 100)
+        if x <= level and cash >= order:
+            qty += order * keep / x
+            cost += order
+            cash -= order
+            peak = None
+            buys += 1
+        equity = cash + qty * x
+        eq_peak = max(eq_peak, equity)
+        drawdown = max(drawdown, 1 - equity / eq_peak)
+    final = cash + qty * closes[-1]
+    return [final, (final / capital - 1) * 100, drawdown * 100, buys, sells, realized, qty > 0]
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def _workers(workers: int) -> int:
+    return workers or os.cpu_count() or 1
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # forkserver: no fork of the event loop, its sockets or the DB pools
+        _pool = ProcessPoolExecutor(_workers(workers), mp_context=multiprocessing.get_context("forkserver"))
+    return _pool
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+async def run(closes: np.ndarray, grid: np.ndarray, workers: int = 0, **kw) -> np.ndarray:
+    """simulate_grid over `grid`, split across the process pool; one chunk runs inline."""
+    chunks = max(1, min(_workers(workers), len(grid) // MIN_CHUNK))
+    if chunks == 1:
+        return await asyncio.to_thread(simulate_grid, closes, grid, **kw)
+    loop = asyncio.get_running_loop()
+    pool = _get_pool(workers)
+    parts = await asyncio.gather(*(
+        loop.run_in_executor(pool, _simulate_chunk, closes, part, kw) for part in np.array_split(grid, chunks)
+    ))
+    return np.vstack(parts)
+
+def _simulate_chunk(closes: np.ndarray, grid: np.ndarray, kw: dict) -> np.ndarray:
+    return simulate_grid(closes, grid, **kw)
+
+async def load_closes(session: AsyncSession, symbol: str, since: datetime, resolution: int,
+                      rollup=None, rollup_until: Optional[datetime] = None) -> np.ndarray:
+    """Closes of `symbol` per `resolution`-second bucket from `since`, oldest first (buckets without ticks are skipped)."""
+    ticks = crud.ticks_since(symbol, since, rollup, rollup_until)
+    rows = (await session.execute(crud.aggregate_ticks(ticks, resolution))).all()
+    return np.array([float(r.close) for r in rows], dtype=np.float64)
+
+def ranked(grid: np.ndarray, results: np.ndarray, top: Optional[int] = None) -> List[Dict[str, float]]:
+    """Parameter sets with their results, best return first."""
+    order = np.argsort(-results[:, 1], kind="stable")[:top]
+    out = []
+    for i in order:
+        row = {name: float(v) for name, v in zip(PARAMS, grid[i])}
+        row.update({name: round(float(v), 6) for name, v in zip(RESULTS, results[i])})
+        for name in ("buys", "sells"):
+            row[name] = int(row[name])
+        row["holding"] = bool(row["holding"])
+        out.append(row)
+    return out
+
+def _check(seed: int = 0):
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 5000)))
+    grid = make_grid([-1, -3, 2], [1, 3], [0.5, 2], [0, 0.5, 1])
+    t0 = time.perf_counter()
+    vec = simulate_grid(closes, grid, fee=0.1)
+    seconds = time.perf_counter() - t0
+    ref = np.array([simulate_one(closes.tolist(), p, fee=0.1) for p in grid])
+    diff = np.abs(vec - ref).max()
+    print(f"{len(grid)} sets x {len(closes)} closes: max difference {diff:.3g}, {seconds * 1000:.1f} ms vectorized")
+    if diff > 1e-6:
+        raise SystemExit(1)
+
+async def _main(args):
+    from sqlalchemy import select
+    from .config import get_config
+    from .db import ReadSessionLocal
+    from .models import RollupState
+    from .retention import retention_windows
+    from .rollups import RollupService
+    cfg = get_config()
+    grid = config_grid(cfg, args.symbol, (args.buy_pct, args.sell_pct, args.rebuy, args.trail))
+    rollups = RollupService(retention=retention_windows(cfg.monitor))
+    async with ReadSessionLocal() as session:
+        res = await session.execute(select(RollupState))
+        rollups.high_water = {r.name: r.high_water for r in res.scalars().all()}
+        rollups.ready = bool(rollups.high_water)
+        since = datetime.utcnow() - timedelta(days=args.days)
+        closes = await load_closes(session, args.symbol, since, args.resolution, *rollups.source_for(args.resolution))
+    if len(closes) == 0:
+        raise SystemExit(f"no prices for {args.symbol} in the last {args.days} days")
+    t0 = time.perf_counter()
+    results = await run(closes, grid, workers=cfg.monitor.simulate_workers, capital=args.capital,
+                        order=args.order, fee=args.fee)
+    shutdown()
+    print(f"{len(grid)} parameter sets x {len(closes)} closes in {time.perf_counter() - t0:.2f} s")
+    print(" ".join(f"{h:>16}" for h in PARAMS + RESULTS))
+    for row in ranked(grid, results, args.top):
+        print(" ".join(f"{row[h]:>16}" for h in PARAMS + RESULTS))
+
+if __name__ == "__main__":
+    import argparse
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("symbol", nargs="?")
+    p.add_argument("--check", action="store_true", help="compare the vectorized replay with the reference and exit")
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--resolution", type=int, default=300, help="bucket width in seconds")
+    p.add_argument("--buy-pct", help="values: a,b,c or start:stop:step (default: the coin's config)")
+    p.add_argument("--sell-pct")
+    p.add_argument("--rebuy")
+    p.add_argument("--trail")
+    p.add_argument("--capital", type=float, default=1000.0)
+    p.add_argument("--order", type=float, default=100.0, help="USDC per buy")
+    p.add_argument("--fee", type=float, default=0.0, help="% per side")
+    p.add_argument("--top", type=int, default=20)
+    args = p.parse_args()
+    if args.check:
+        _check()
+    elif not args.symbol:
+        p.error("symbol is required")
+    else:
+        args.symbol = args.symbol.upper()
+        asyncio.run(_main(args))
@@ -0,0 +1,219 @@
+import asyncio, logging, time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional, Tuple
+from sqlalchemy import select
+
+from .config import get_config
+from .db import ReadSessionLocal
+from .models import Balance, TradingState
+from .ledger import ledger, PositionLedger
+from . import crud
+
+log = logging.getLogger(__name__)
+
+# a follower serves a published value this many TTLs before it loads one itself
+FOLLOW_GRACE = 3
+
+def D(x) -> Decimal:
+    return Decimal(str(x))
+
+@dataclass
+class MarketSnapshot:
+    taken_at: datetime
+    balances: Dict[str, Decimal]                  # CURRENCY -> available balance
+    profit: Dict[str, Decimal]                    # SYMBOL -> trading_state.total_profit
+    initial: Dict[str, Optional[Decimal]]         # SYMBOL -> trading_state.initial_price
+    prices: Dict[str, Optional[Decimal]]          # enabled COIN -> latest price
+    latest_price_ts: Optional[datetime]
+    updated_symbols_last_min: int
+    last_trade: Optional[Tuple]                   # (symbol, side, amount, price, timestamp)
+    ledger: Dict[str, Any]                        # positions.stats() after folding in the new trades
+    derived: Dict[str, Any] = field(default_factory=dict, repr=False)  # memo of values computed from this snapshot
+
+async def load_snapshot(sessions=ReadSessionLocal, positions: PositionLedger = ledger) -> MarketSnapshot:
+    """Snapshot of the database behind `sessions`; its trades are folded into `positions`."""
+    cfg = get_config()
+    coins = [s.upper() for s, c in cfg.coins.items() if c.enabled and s.upper() != "USDC"]
+    now = datetime.utcnow()
+
+    async with sessions() as session:
+        res = await session.execute(select(Balance))
+        bal = {b.currency.upper(): D(b.available_balance or 0) for b in res.scalars().all()}
+
+        res = await session.execute(select(TradingState))
+        state_rows = res.scalars().all()
+        profit = {r.symbol.upper(): (D(r.total_profit) if r.total_profit is not None else D("0")) for r in state_rows}
+        initial = {r.symbol.upper(): (D(r.initial_price) if r.initial_price is not None else None) for r in state_rows}
+
+        latest = await crud.get_latest_prices(session, coins)
+        prices = {c: (D(v) if v is not None else None) for c, v in latest.items()}
+
+        latest_ts = (await session.execute(crud.latest_price_ts_stmt())).scalar_one_or_none()
+        updated = (await session.execute(crud.symbols_updated_since_stmt(now - timedelta(seconds=60)))).scalar_one()
+        last_trade = (await session.execute(crud.last_trade_stmt())).first()
+
+        # fold new trades into the in-memory positions (DCA, last SELL)
+        await positions.refresh(session)
+
+    return MarketSnapshot(
+        taken_at=now,
+        balances=bal,
+        profit=profit,
+        initial=initial,
+        prices=prices,
+        latest_price_ts=latest_ts,
+        updated_symbols_last_min=int(updated or 0),
+        last_trade=tuple(last_trade) if last_trade else None,
+        ledger=positions.stats(),
+    )
+
+def _dec(x: Optional[Decimal]) -> Optional[str]:
+    return str(x) if x is not None else None
+
+def _undec(x: Optional[str]) -> Optional[Decimal]:
+    return Decimal(x) if x is not None else None
+
+def _ts(x: Optional[datetime]) -> Optional[str]:
+    return x.isoformat() if x is not None else None
+
+def _unts(x: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(x) if x is not None else None
+
+def encode_snapshot(snap: MarketSnapshot) -> dict:
+    """JSON-safe form of `snap` for followers; `derived` is rebuilt on their side."""
+    last = snap.last_trade
+    return {
+        "taken_at": snap.taken_at.isoformat(),
+        "balances": {k: _dec(v) for k, v in snap.balances.items()},
+        "profit": {k: _dec(v) for k, v in snap.profit.items()},
+        "initial": {k: _dec(v) for k, v in snap.initial.items()},
+        "prices": {k: _dec(v) for k, v in snap.prices.items()},
+        "latest_price_ts": _ts(snap.latest_price_ts),
+        "updated_symbols_last_min": snap.updated_symbols_last_min,
+        "last_trade": [*last[:4], _ts(last[4])] if last else None,
+        "ledger": snap.ledger,
+    }
+
+def decode_snapshot(d: dict) -> MarketSnapshot:
+    last = d["last_trade"]
+    return MarketSnapshot(
+        taken_at=datetime.fromisoformat(d["taken_at"]),
+        balances={k: _undec(v) for k, v in d["balances"].items()},
+        profit={k: _undec(v) for k, v in d["profit"].items()},
+        initial={k: _undec(v) for k, v in d["initial"].items()},
+        prices={k: _undec(v) for k, v in d["prices"].items()},
+        latest_price_ts=_unts(d["latest_price_ts"]),
+        updated_symbols_last_min=d["updated_symbols_last_min"],
+        last_trade=(*last[:4], _unts(last[4])) if last else None,
+        ledger=d["ledger"],
+    )
+
+class SnapshotCache:
+    """
+    TTL cache around one loader with single-flight refresh: when the value is
+    stale, the first caller loads it and concurrent callers wait on that load.
+
+    Under coordination (app/coord.py) the leader keeps the value fresh while
+    followers are connected (`start`) and publishes every load as a `kind`
+    message; followers adopt it (`follow`) and only load it themselves once
+    the published value is FOLLOW_GRACE TTLs old, e.g. while a new leader is
+    being elected.
+    """
+    def __init__(self, loader, ttl: float, kind: Optional[str] = None,
+                 encode: Callable[[Any], Any] = lambda v: v, decode: Callable[[Any], Any] = lambda v: v):
+        self._loader = loader
+        self.ttl = ttl
+        self.kind = kind
+        self._encode, self._decode = encode, decode
+        self.publish: Callable[[dict], None] = lambda msg: None
+        self._value = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self._following = False
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0    # callers that waited on someone else's refresh
+        self.followed = 0     # values adopted from the leader
+
+    def _fresh(self) -> bool:
+        limit = self.ttl * FOLLOW_GRACE if self._following else self.ttl
+        return self._value is not None and time.monotonic() - self._loaded_at < limit
+
+    async def get(self):
+        if self._fresh():
+            self.hits += 1
+            return self._value
+        async with self._lock:
+            if self._fresh():
+                self.coalesced += 1
+                return self._value
+            self.misses += 1
+            self._value = await self._loader()
+            self._loaded_at = time.monotonic()
+            if self.kind is not None:
+                self.publish(self.message())
+            return self._value
+
+    def invalidate(self):
+        # a follower gets the reloaded value from the leader, which saw the same change
+        if not self._following:
+            self._loaded_at = 0.0
+            self._changed.set()
+
+    # --- sharing between workers ---
+    def message(self) -> Optional[dict]:
+        if self._value is None:
+            return None
+        return {"kind": self.kind, "value": self._encode(self._value)}
+
+    def follow(self, msg: dict):
+        """Follower: adopt the value the leader loaded."""
+        self._value = self._decode(msg["value"])
+        self._loaded_at = time.monotonic()
+        self._following = True
+        self.followed += 1
+
+    def start(self, wanted: Callable[[], bool]):
+        """Leader: reload the value when it goes stale or is invalidated, while `wanted()`."""
+        self._following = False
+        if self._task is None:
+            self._task = asyncio.create_task(self._keep_fresh(wanted), name=f"share-{self.kind}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _keep_fresh(self, wanted: Callable[[], bool]):
+        while True:
+            self._changed.clear()
+            if wanted():
+                try:
+                    await self.get()       # loads (and publishes) only when stale
+                except Exception as e:
+                    log.warning("%s refresh failed: %s", self.kind, e)
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=self.ttl)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "followed": self.followed,
+            "age_seconds": (time.monotonic() - self._loaded_at) if self._value is not None else None,
+        }
+
+snapshot = SnapshotCache(load_snapshot, ttl=get_config().monitor.snapshot_ttl, kind="snapshot",
+                         encode=encode_snapshot, decode=decode_snapshot)
@@ -0,0 +1,187 @@
+"""
+Several bot databases in one monitor.
+
+With `database` given as a list, each entry is a source: a bot database with
+its own read pool (app/db.py), market snapshot and position ledger. The first
+one is also the primary: the rollups, retention, live feed, stream and every
+write go there only.
+
+/api/portfolio/summary, /api/coins/badges and /api/trades ask every source at
+once (`fan_out`), give each `source_timeout` seconds, and merge what came
+back; sources that failed or timed out are listed under `errors` instead of
+failing the request, so it takes about as long as the slowest source.
+
+Merged trades are ordered by (timestamp, source, id). Their cursors hold one
+trades cursor (app/trades.py) per source: the last row that source showed on
+the page, and every source pages on its own keyset from there. A source
+missing from a cursor has not shown a row yet: `before` starts it from its
+newest trade, `after` gives nothing newer for it.
+"""
+import asyncio, base64, logging
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import orjson
+
+from .config import get_config
+from .db import SourceSessions
+from .ledger import ledger, PositionLedger
+from .snapshot import SnapshotCache, load_snapshot, snapshot
+from .badges import compute_badges, compute_portfolio
+from . import crud
+from . import trades
+
+log = logging.getLogger(__name__)
+
+# keyset bounds past every trade, for a source whose cursor has to include its end
+FIRST = (datetime.min, 0)
+LAST = (datetime.max, 2**31 - 1)
+
+@dataclass
+class Source:
+    name: str
+    sessions: Any                      # async_sessionmaker for reads
+    snapshots: SnapshotCache
+    positions: PositionLedger
+    primary: bool = False
+
+def _build() -> Dict[str, Source]:
+    ttl = get_config().monitor.snapshot_ttl
+    out = {}
+    for i, (name, sessions) in enumerate(SourceSessions.items()):
+        if i == 0:
+            out[name] = Source(name, sessions, snapshot, ledger, primary=True)
+        else:
+            positions = PositionLedger()
+            out[name] = Source(name, sessions, SnapshotCache(partial(load_snapshot, sessions, positions), ttl), positions)
+    return out
+
+sources = _build()
+
+def multiple() -> bool:
+    return len(sources) > 1
+
+async def fan_out(call: Callable[[Source], Awaitable[Any]],
+                  timeout: Optional[float] = None) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """`call` on every source concurrently; (results, errors) keyed by source name, in config order."""
+    timeout = timeout if timeout is not None else get_config().monitor.source_timeout
+    names = list(sources)
+    done = await asyncio.gather(*(asyncio.wait_for(call(sources[n]), timeout) for n in names),
+                                return_exceptions=True)
+    results, errors = {}, {}
+    for name, r in zip(names, done):
+        if isinstance(r, asyncio.TimeoutError):
+            errors[name] = f"timed out after {timeout:g} s"
+        elif isinstance(r, BaseException):
+            log.warning("source %s failed: %r", name, r)
+            errors[name] = f"{type(r).__name__}: {r}"
+        else:
+            results[name] = r
+    return results, errors
+
+# --- badges ---
+async def badges(lookback_hours: int, rollup=None) -> dict:
+    """Every source's badge rows, tagged with `source`; `rollup` only applies to the primary."""
+    async def one(src: Source):
+        async with src.sessions() as session:
+            return await compute_badges(session, lookback_hours, rollup=rollup if src.primary else None,
+                                        snapshots=src.snapshots)
+    results, errors = await fan_out(one)
+    return {
+        "coins": [{**row, "source": name} for name, body in results.items() for row in body["coins"]],
+        "errors": errors,
+    }
+
+# --- portfolio ---
+def _q2(x: Decimal) -> str:
+    return str(x.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+
+async def portfolio() -> dict:
+    """Portfolio summed over the sources (per coin in `breakdown`), with each source's own body."""
+    results, errors = await fan_out(lambda src: compute_portfolio(src.snapshots))
+    coins: Dict[str, dict] = {}
+    usdc = holdings = Decimal("0")
+    for body in results.values():
+        usdc += Decimal(body["usdc_available"])
+        for b in body["breakdown"]:
+            c = coins.setdefault(b["coin"], {"amount": Decimal("0"), "price": None, "value": None})
+            c["amount"] += Decimal(b["amount"])
+            if c["price"] is None:
+                c["price"] = b["price_usdc"]
+            if b["value_usdc"] is not None:
+                c["value"] = (c["value"] or Decimal("0")) + Decimal(b["value_usdc"])
+                holdings += Decimal(b["value_usdc"])     # unrounded, like portfolio_decimal
+    return {
+        "usdc_available": _q2(usdc),
+        "holdings_value_usdc": _q2(holdings),
+        "total_usdc": _q2(usdc + holdings),
+        "breakdown": [{
+            "coin": coin,
+            "amount": str(c["amount"]),
+            "price_usdc": c["price"],
+            "value_usdc": str(c["value"]) if c["value"] is not None else None,
+        } for coin, c in coins.items()],
+        "sources": results,
+        "errors": errors,
+    }
+
+# --- trades ---
+def encode_cursor(positions: Dict[str, Tuple[datetime, int]]) -> str:
+    inner = {name: trades.encode_cursor(ts, tid) for name, (ts, tid) in sorted(positions.items())}
+    return base64.urlsafe_b64encode(orjson.dumps(inner)).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Dict[str, Tuple[datetime, int]]:
+    """Inverse of encode_cursor; ValueError for anything it didn't produce."""
+    try:
+        inner = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return {name: trades.decode_cursor(c) for name, c in inner.items() if name in sources}
+    except Exception as e:
+        raise ValueError(f"invalid cursor {cursor!r}") from e
+
+async def trades_page(limit: int, symbol: Optional[str] = None, side: Optional[str] = None,
+                      since: Optional[datetime] = None, until: Optional[datetime] = None,
+                      before: Optional[str] = None, after: Optional[str] = None) -> dict:
+    """trades.page over every source, merged newest first; each trade carries its `source`."""
+    newer = after is not None
+    positions = decode_cursor(after or before) if (after or before) else {}
+
+    async def one(src: Source) -> List:
+        key = positions.get(src.name)
+        if newer and key is None:
+            return []
+        # one extra row per source tells whether anything is left after the page
+        stmt = crud.trades_page_stmt(limit + 1, symbol=symbol, side=side, since=since, until=until,
+                                     before=None if newer else key, after=key if newer else None)
+        async with src.sessions() as session:
+            return (await session.execute(stmt)).all()
+
+    results, errors = await fan_out(one)
+    rows = sorted(((r.timestamp, name, r.id), name, r) for name, found in results.items() for r in found)
+    if newer:
+        picked = rows[:limit][::-1]
+    else:
+        picked = rows[::-1][:limit]
+    more = len(rows) > limit
+    has_older, has_newer = (True, more) if newer else (more, before is not None)
+
+    # per source, the oldest and the newest of its rows on the page (picked is newest first)
+    oldest, newest = dict(positions), dict(positions)
+    for (ts, name, tid), _, _ in picked:
+        oldest[name] = (ts, tid)
+    for (ts, name, tid), _, _ in reversed(picked):
+        newest[name] = (ts, tid)
+    # a source with no rows on the page pages back to the row at its cursor, not past it:
+    # the cursor moves to the next row it fetched beyond the page, or to the end of its history
+    shown = {name for _, name, _ in picked}
+    for name, found in results.items():
+        if name in positions and name not in shown:
+            edge = (found[0].timestamp, found[0].id) if found else (LAST if newer else FIRST)
+            (oldest if newer else newest)[name] = edge
+    return {
+        "trades": [{**trades.row_to_dict(r), "source": name} for _, name, r in picked],
+        "next_cursor": encode_cursor(oldest) if picked and has_older else None,
+        "prev_cursor": encode_cursor(newest) if picked and has_newer else None,
+        "errors": errors,
+    }
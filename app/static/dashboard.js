@@ -365,8 +365,10 @@ async function loadSymbols() {
 }
 
 let priceChart;
+const PRICE_CHART_POINTS = 600;
 async function renderPrice(symbol, hours) {
-  const series = await fetchJSON(`/api/price_history?symbol=${encodeURIComponent(symbol)}&hours=${hours}`);
+  // The chart is a few hundred px wide: let the server bucket the window
+  const series = await fetchJSON(`/api/price_history?symbol=${encodeURIComponent(symbol)}&hours=${hours}&max_points=${PRICE_CHART_POINTS}`);
   const labels = series.points.map(p => new Date(p.timestamp).toLocaleString());
   const data = series.points.map(p => p.price);
 
@@ -443,19 +445,57 @@ async function bootstrap() {
     }
   }
 
+  // Live state rebuilt from the server's snapshot + delta messages
+  let ws = null;
+  const live = { seq: null, status: null, balances: {}, trades: [], resyncing: false };
+
+  function applySnapshot(msg) {
+    live.seq = msg.seq;
+    live.resyncing = false;
+    live.status = msg.status;
+    live.balances = {};
+    for (const b of msg.balances || []) live.balances[b.currency] = b.available_balance;
+    live.trades = msg.trades || [];
+  }
+
+  function applyDelta(msg) {
+    live.seq = msg.seq;
+    if (msg.status) live.status = msg.status;
+    for (const b of msg.balances || []) live.balances[b.currency] = b.available_balance;
+    for (const c of msg.removed_balances || []) delete live.balances[c];
+    if (msg.trades?.length) live.trades = [...msg.trades, ...live.trades].slice(0, 10);
+  }
+
   function connectWS() {
-    const ws = new WebSocket(`${location.protocol === "https:" ? "wss" : "ws"}://${location.host}/ws/live`);
+    ws = new WebSocket(`${location.protocol === "https:" ? "wss" : "ws"}://${location.host}/ws/live`);
     ws.onopen = () => {
+      live.seq = null;
+      live.resyncing = false;
       try { ws.send(JSON.stringify({ subscribe: [symbolSelect.value] })); } catch {}
     };
 
     ws.onmessage = async (ev) => {
       const msg = JSON.parse(ev.data);
-      if (msg.type !== "tick") return;
+      if (msg.type === "snapshot") {
+        applySnapshot(msg);
+      } else if (msg.type === "delta") {
+        // 1) missed a message (or no snapshot yet) → ask for a fresh snapshot
+        if (live.seq == null || msg.seq !== live.seq + 1) {
+          live.seq = null;
+          if (!live.resyncing) {
+            live.resyncing = true;
+            try { ws.send(JSON.stringify({ resync: true })); } catch {}
+          }
+          return;
+        }
+        applyDelta(msg);
+      } else {
+        return;
+      }
 
       // 2) If status.last_trade changed, force-refresh trades immediately
-      if (msg.status?.last_trade && msg.status.last_trade !== lastTradeStamp) {
-        lastTradeStamp = msg.status.last_trade;
+      if (live.status?.last_trade && live.status.last_trade !== lastTradeStamp) {
+        lastTradeStamp = live.status.last_trade;
         await fetchAndRenderTrades(20);
       } else {
         // Otherwise refresh on any tick, but throttled
@@ -467,10 +507,8 @@ async function bootstrap() {
       }
 
       // 3) balances → badges & balances table (throttled badges)
-      if (Array.isArray(msg.balances)) {
-        await maybeRefreshBadges();
-        renderBalances(msg.balances);
-      }
+      await maybeRefreshBadges();
+      renderBalances(Object.entries(live.balances).map(([currency, available_balance]) => ({ currency, available_balance })));
 
       // 4) totals
       refreshSummary();
@@ -0,0 +1,205 @@
+import asyncio, json, logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+class Event(NamedTuple):
+    id: int
+    name: str                  # "badge" | "portfolio"
+    symbol: Optional[str]      # coin for badge events, None for portfolio
+    data: str                  # JSON payload
+
+    def encode(self) -> str:
+        return f"id: {self.id}\nevent: {self.name}\ndata: {self.data}\n\n"
+
+class Subscriber:
+    """One /api/stream response: a symbol filter and a bounded queue of event batches."""
+    def __init__(self, symbols: Optional[Set[str]], queue_size: int):
+        self.symbols = symbols                 # None = every coin
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.sent = 0
+        self.resyncs = 0
+
+    def wants(self, event: Event) -> bool:
+        return event.symbol is None or self.symbols is None or event.symbol in self.symbols
+
+class StreamHub:
+    """
+    Single producer for /api/stream. Every `interval` seconds (or sooner when
+    woken by a DB change) it computes badges and the portfolio once, turns each
+    coin whose badge changed into a "badge" event and a changed portfolio into
+    a "portfolio" event, and queues them for every subscriber whose symbol
+    filter matches. Idles while nobody is subscribed.
+
+    Event ids increase monotonically; the last `history` events are kept so a
+    reconnecting client's Last-Event-ID can be answered by replaying what it
+    missed. An unknown or too-old id, or a subscriber whose queue overflowed,
+    gets the current state instead: the latest event of every coin plus the
+    portfolio, under their original ids.
+
+    Under worker coordination (app/coord.py) only the leader ticks; its new
+    events go to `publish` and followers replay them with `apply`, so every
+    worker hands out the same ids.
+    """
+    def __init__(self, loader: Callable[[], Awaitable[Tuple[dict, dict]]], interval: float = 5.0,
+                 heartbeat: float = 15.0, queue_size: int = 8, history: int = 1000):
+        self.loader = loader                   # -> (badges body, portfolio body)
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.queue_size = queue_size
+        self.last_id = 0
+        self.history: Deque[Event] = deque(maxlen=history)
+        self.current: Dict[Tuple[str, Optional[str]], Event] = {}
+        self.subscribers: Set[Subscriber] = set()
+        self.remote_subscribers = False       # leader: some follower has subscribers
+        self.publish: Optional[Callable[[dict], None]] = None
+        self.ticks = 0
+        self._has_subscribers = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="stream-hub")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        self._wake.set()
+
+    def set_remote_demand(self, wanted: bool):
+        self.remote_subscribers = wanted
+        if wanted:
+            self._has_subscribers.set()
+        elif not self.subscribers:
+            self._has_subscribers.clear()
+
+    async def _run(self):
+        while True:
+            await self._has_subscribers.wait()
+            try:
+                with metrics.scope("stream_tick"):
+                    await self.tick()
+            except Exception:
+                log.exception("stream tick failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _emit(self, name: str, symbol: Optional[str], body: dict) -> Optional[Event]:
+        data = json.dumps(body, default=str, separators=(",", ":"))
+        prev = self.current.get((name, symbol))
+        if prev is not None and prev.data == data:
+            return None
+        self.last_id += 1
+        event = Event(self.last_id, name, symbol, data)
+        self.current[(name, symbol)] = event
+        self.history.append(event)
+        return event
+
+    async def tick(self):
+        badges, portfolio = await self.loader()
+        self.ticks += 1
+        events = [self._emit("badge", row["coin"], row) for row in badges["coins"]]
+        events.append(self._emit("portfolio", None, portfolio))
+        events = [e for e in events if e is not None]
+        if events and self.publish is not None:
+            self.publish(self.message(events))
+        self._deliver(events)
+
+    def _deliver(self, events: List[Event]):
+        if events:
+            for sub in list(self.subscribers):
+                self._push(sub, [e for e in events if sub.wants(e)])
+
+    def message(self, events: Optional[List[Event]] = None) -> dict:
+        """`events` (default: the current state) for followers."""
+        if events is None:
+            events = sorted(self.current.values(), key=lambda e: e.id)
+        return {"kind": "stream", "events": [list(e) for e in events]}
+
+    def apply(self, msg: dict):
+        """Follower: take over events from the leader, skipping ids already seen."""
+        events = [Event(*e) for e in msg["events"] if e[0] > self.last_id]
+        for event in events:
+            self.current[(event.name, event.symbol)] = event
+            self.history.append(event)
+            self.last_id = event.id
+        self._deliver(events)
+
+    def _push(self, sub: Subscriber, batch: List[Event]):
+        if not batch:
+            return
+        if sub.queue.full():
+            # too far behind: drop the backlog and send the current state instead
+            while not sub.queue.empty():
+                sub.queue.get_nowait()
+            sub.resyncs += 1
+            batch = self.state_for(sub)
+        sub.queue.put_nowait(batch)
+
+    def state_for(self, sub: Subscriber) -> List[Event]:
+        return sorted((e for e in self.current.values() if sub.wants(e)), key=lambda e: e.id)
+
+    def backlog(self, sub: Subscriber, last_event_id: Optional[int]) -> List[Event]:
+        """What a (re)connecting subscriber is owed before live events."""
+        if last_event_id is not None and self.history and self.history[0].id - 1 <= last_event_id <= self.last_id:
+            return [e for e in self.history if e.id > last_event_id and sub.wants(e)]
+        if last_event_id is not None and not self.history and last_event_id == self.last_id:
+            return []
+        return self.state_for(sub)
+
+    def subscribe(self, symbols: Optional[Set[str]], last_event_id: Optional[int] = None) -> Subscriber:
+        sub = Subscriber(symbols, self.queue_size)
+        self._push(sub, self.backlog(sub, last_event_id))
+        self.subscribers.add(sub)
+        self._has_subscribers.set()
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self.subscribers.discard(sub)
+        if not self.subscribers and not self.remote_subscribers:
+            self._has_subscribers.clear()
+
+    async def events(self, sub: Subscriber):
+        """SSE body for `sub`: queued events, a comment line every `heartbeat` seconds when idle."""
+        try:
+            yield f"retry: {int(self.interval * 1000)}\n\n"
+            while True:
+                try:
+                    batch = await asyncio.wait_for(sub.queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                sub.sent += len(batch)
+                yield "".join(e.encode() for e in batch)
+        finally:
+            self.unsubscribe(sub)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "last_event_id": self.last_id,
+            "history": len(self.history),
+            "ticks": self.ticks,
+            "interval": self.interval,
+            "heartbeat": self.heartbeat,
+            "clients": [{
+                "symbols": sorted(s.symbols) if s.symbols is not None else None,
+                "queue_depth": s.queue.qsize(),
+                "sent": s.sent,
+                "resyncs": s.resyncs,
+            } for s in self.subscribers],
+        }
@@ -0,0 +1,131 @@
+"""
+Bulk price_history export and import.
+
+Exports read through a server-side cursor (`yield_per`) and are encoded one
+fetch at a time as CSV, NDJSON, or "columnar": one JSON object of parallel
+arrays per chunk (`symbol`, epoch-ms `t`, `p`). CSV keeps the exact numeric
+text of `price` and is the import format.
+
+Imports COPY the CSV into a temporary table and insert it into price_history,
+skipping ticks that already exist, so a fresh database can be backfilled from
+another monitor's export and re-running an import is harmless. Rollup
+high-water marks are moved back to the oldest imported tick so the next pass
+folds the new history in.
+
+    CONFIG_PATH=.env/config.json python -m app.ticks export --symbol ETH --since 2025-01-01 > eth.csv
+    CONFIG_PATH=.env/config.json python -m app.ticks import eth.csv
+"""
+import asyncio, csv, io, sys, time
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, Optional
+import numpy as np
+import orjson
+from sqlalchemy import func, text, update
+
+from .db import AsyncSessionLocal, ReadSessionLocal
+from .models import RollupState
+from .series import epoch_ms
+from . import crud
+
+EXPORT_CHUNK = 10_000
+CSV_FIELDS = ("symbol", "timestamp", "price")
+
+def _csv_chunk(rows) -> bytes:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(
+        (r.symbol, r.timestamp.isoformat(), "" if r.price is None else str(r.price)) for r in rows
+    )
+    return buf.getvalue().encode()
+
+def _ndjson_chunk(rows) -> bytes:
+    return b"".join(orjson.dumps({
+        "symbol": r.symbol,
+        "timestamp": r.timestamp.isoformat(),
+        "price": float(r.price) if r.price is not None else None,
+    }) + b"\n" for r in rows)
+
+def _columnar_chunk(rows) -> bytes:
+    n = len(rows)
+    columns = {
+        "symbol": [r.symbol for r in rows],
+        "t": np.fromiter((epoch_ms(r.timestamp) for r in rows), dtype=np.int64, count=n),
+        "p": np.fromiter((np.nan if r.price is None else float(r.price) for r in rows), dtype=np.float64, count=n),
+    }
+    return orjson.dumps(columns, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+
+ENCODERS = {"csv": _csv_chunk, "ndjson": _ndjson_chunk, "columnar": _columnar_chunk}
+
+async def export(fmt: str, symbol: Optional[str] = None, since: Optional[datetime] = None,
+                 until: Optional[datetime] = None, chunk: int = EXPORT_CHUNK) -> AsyncIterator[bytes]:
+    """Matching ticks ordered by (symbol, timestamp), one encoded chunk per fetch."""
+    encode = ENCODERS[fmt]
+    stmt = crud.price_export_stmt(symbol=symbol, since=since, until=until)
+    async with ReadSessionLocal() as session:
+        result = await session.stream(stmt.execution_options(yield_per=chunk))
+        if fmt == "csv":
+            yield (",".join(CSV_FIELDS) + "\n").encode()
+        async for rows in result.partitions():
+            yield encode(rows)
+
+async def import_csv(source: AsyncIterable[bytes]) -> dict:
+    """COPY CSV (symbol,timestamp,price with a header row, as exported) into price_history."""
+    t0 = time.perf_counter()
+    async with AsyncSessionLocal() as session:
+        conn = await session.connection()
+        await conn.execute(text(
+            "CREATE TEMP TABLE price_import (LIKE price_history INCLUDING DEFAULTS) ON COMMIT DROP"
+        ))
+        raw = (await conn.get_raw_connection()).driver_connection
+        await raw.copy_to_table("price_import", source=source, columns=list(CSV_FIELDS), format="csv", header=True)
+        read, oldest, newest = (await conn.execute(text(
+            "SELECT count(*), min(timestamp), max(timestamp) FROM price_import"
+        ))).one()
+        inserted = (await conn.execute(text(
+            "INSERT INTO price_history (symbol, timestamp, price) "
+            "SELECT symbol, timestamp, price FROM price_import ON CONFLICT DO NOTHING"
+        ))).rowcount
+        if inserted and oldest is not None:
+            await conn.execute(
+                update(RollupState).where(RollupState.high_water > oldest)
+                .values(high_water=func.least(RollupState.high_water, oldest))
+            )
+        await session.commit()
+    return {
+        "rows_read": read,
+        "rows_inserted": inserted,
+        "oldest": oldest.isoformat() if oldest else None,
+        "newest": newest.isoformat() if newest else None,
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+
+async def _read_file(path: str, size: int = 1 << 20) -> AsyncIterator[bytes]:
+    f = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        while block := f.read(size):
+            yield block
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+
+async def _main(args):
+    if args.command == "import":
+        print(orjson.dumps(await import_csv(_read_file(args.path))).decode())
+        return
+    out = sys.stdout.buffer
+    async for chunk in export(args.format, symbol=args.symbol.upper() if args.symbol else None,
+                              since=args.since, until=args.until):
+        out.write(chunk)
+    out.flush()
+
+if __name__ == "__main__":
+    import argparse
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = p.add_subparsers(dest="command", required=True)
+    e = sub.add_parser("export", help="write price_history to stdout")
+    e.add_argument("--format", choices=sorted(ENCODERS), default="csv")
+    e.add_argument("--symbol")
+    e.add_argument("--since", type=datetime.fromisoformat)
+    e.add_argument("--until", type=datetime.fromisoformat)
+    i = sub.add_parser("import", help="COPY an exported CSV into price_history")
+    i.add_argument("path", help="CSV file, or - for stdin")
+    asyncio.run(_main(p.parse_args()))
@@ -0,0 +1,97 @@
+"""
+Trade history: keyset pages for /api/trades and streamed exports.
+
+Pages are keyed on (timestamp, id) instead of OFFSET, so page N costs the
+same as page 1 and rows inserted meanwhile don't shift later pages. Cursors
+are opaque strings; `next_cursor` pages towards older trades, `prev_cursor`
+towards newer ones.
+
+Exports read through a server-side cursor `EXPORT_CHUNK` rows at a time and
+are encoded chunk by chunk, so memory stays flat however long the history.
+"""
+import base64, csv, io
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional, Tuple
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import ReadSessionLocal
+from . import crud
+
+EXPORT_CHUNK = 2000
+CSV_FIELDS = ("id", "symbol", "side", "amount", "price", "timestamp")
+
+def row_to_dict(t):
+    """A Trade, or a row of crud.TRADE_COLUMNS, as the /api/trades JSON object."""
+    return {
+        "id": t.id,
+        "symbol": t.symbol,
+        "side": t.side,
+        "amount": float(t.amount) if t.amount is not None else None,
+        "price": float(t.price) if t.price is not None else None,
+        "timestamp": t.timestamp.isoformat() if t.timestamp else None,
+    }
+
+def encode_cursor(ts: datetime, trade_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{ts.isoformat()}|{trade_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; ValueError for anything it didn't produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, trade_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(trade_id)
+    except Exception as e:
+        raise ValueError(f"invalid cursor {cursor!r}") from e
+
+def utc_naive(ts: Optional[datetime]) -> Optional[datetime]:
+    # trades.timestamp is naive UTC; accept offsets in query parameters
+    if ts is None or ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+async def page(session: AsyncSession, limit: int, symbol: Optional[str] = None, side: Optional[str] = None,
+               since: Optional[datetime] = None, until: Optional[datetime] = None,
+               before: Optional[str] = None, after: Optional[str] = None) -> dict:
+    """/api/trades body: `limit` trades newest first, with cursors to the neighbouring pages."""
+    before_key = decode_cursor(before) if before else None
+    after_key = decode_cursor(after) if after else None
+    # one extra row tells whether anything is left after the page
+    stmt = crud.trades_page_stmt(limit + 1, symbol=symbol, side=side, since=since, until=until,
+                                 before=before_key, after=after_key)
+    rows = (await session.execute(stmt)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if after_key is not None:
+        rows.reverse()
+        has_older, has_newer = True, more
+    else:
+        has_older, has_newer = more, before_key is not None
+    return {
+        "trades": [row_to_dict(r) for r in rows],
+        "next_cursor": encode_cursor(rows[-1].timestamp, rows[-1].id) if rows and has_older else None,
+        "prev_cursor": encode_cursor(rows[0].timestamp, rows[0].id) if rows and has_newer else None,
+    }
+
+def _csv_chunk(rows, header: bool) -> bytes:
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    if header:
+        w.writerow(CSV_FIELDS)
+    w.writerows((r.id, r.symbol, r.side, r.amount, r.price, r.timestamp.isoformat()) for r in rows)
+    return buf.getvalue().encode()
+
+def _ndjson_chunk(rows: List) -> bytes:
+    return b"".join(orjson.dumps(row_to_dict(r)) + b"\n" for r in rows)
+
+async def export(fmt: str, symbol: Optional[str] = None, side: Optional[str] = None,
+                 since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 chunk: int = EXPORT_CHUNK) -> AsyncIterator[bytes]:
+    """Every matching trade, oldest first, as CSV (with a header row) or NDJSON, one chunk per fetch."""
+    stmt = crud.trades_export_stmt(symbol=symbol, side=side, since=since, until=until)
+    async with ReadSessionLocal() as session:
+        result = await session.stream(stmt.execution_options(yield_per=chunk))
+        if fmt == "csv":
+            yield _csv_chunk([], header=True)
+        async for rows in result.partitions():
+            yield _csv_chunk(rows, header=False) if fmt == "csv" else _ndjson_chunk(rows)
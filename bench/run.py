@@ -0,0 +1,244 @@
+"""
+Load-test a running monitor and save the results as JSON.
+
+    CONFIG_PATH=bench/config.bench.json uvicorn app.main:app --port 8080 &
+    CONFIG_PATH=bench/config.bench.json python -m bench.run --url http://localhost:8080 --out bench/results/$(git rev-parse --short HEAD).json
+    python -m bench.run --compare bench/results/old.json bench/results/new.json
+
+Each HTTP scenario runs `--concurrency` workers against one endpoint for
+`--duration` seconds and reports p50/p95/p99/mean latency, throughput and
+errors. Queries per request come from pg_stat_statements on the database in
+CONFIG_PATH when the extension is installed (null otherwise), so run it
+against a database nothing else is using.
+
+The WebSocket scenario holds `--ws-clients` /ws/live connections spread over
+the configured coins plus the unfiltered group, and reports connect latency,
+messages per client per second and the fan-out skew: how far apart the
+clients of one group received the same tick (same seq).
+"""
+import argparse, asyncio, json, os, platform, subprocess, time
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+import httpx
+import websockets
+
+def summarize(latencies: List[float], seconds: float, errors: int) -> dict:
+    ms = np.array(latencies) * 1000.0
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / seconds, 1) if seconds else None,
+        "p50_ms": round(float(np.percentile(ms, 50)), 2) if len(ms) else None,
+        "p95_ms": round(float(np.percentile(ms, 95)), 2) if len(ms) else None,
+        "p99_ms": round(float(np.percentile(ms, 99)), 2) if len(ms) else None,
+        "mean_ms": round(float(ms.mean()), 2) if len(ms) else None,
+    }
+
+class QueryCounter:
+    """Statement count of the benchmark database, from pg_stat_statements."""
+    def __init__(self):
+        self.conn = None
+
+    async def open(self):
+        import asyncpg
+        from app.config import get_config
+        db = get_config().database
+        try:
+            self.conn = await asyncpg.connect(host=db.host, port=db.port, user=db.user,
+                                              password=db.password, database=db.name)
+            await self.read()
+        except Exception as e:
+            print(f"queries per request unavailable ({e.__class__.__name__}: {e})")
+            if self.conn is not None:
+                await self.conn.close()
+            self.conn = None
+
+    async def read(self) -> Optional[int]:
+        if self.conn is None:
+            return None
+        return await self.conn.fetchval(
+            "SELECT coalesce(sum(calls), 0)::bigint FROM pg_stat_statements "
+            "WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())"
+        )
+
+    async def close(self):
+        if self.conn is not None:
+            await self.conn.close()
+
+async def http_scenario(client: httpx.AsyncClient, path: str, concurrency: int, duration: float,
+                        queries: QueryCounter) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                r = await client.get(path)
+                ok = r.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - t0)
+            else:
+                errors += 1
+
+    before = await queries.read()
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    after = await queries.read()
+
+    out = {"path": path, "concurrency": concurrency, **summarize(latencies, elapsed, errors)}
+    # the second read counts the first one
+    out["queries_per_request"] = (round((after - before - 1) / len(latencies), 2)
+                                  if before is not None and after is not None and latencies else None)
+    return out
+
+async def ws_scenario(base_url: str, clients: int, duration: float, coins: List[str]) -> dict:
+    ws_url = base_url.replace("http", "ws", 1).rstrip("/") + "/ws/live"
+    groups: List[Optional[str]] = [None] + coins
+    connect_times: List[float] = []
+    joined: Dict[Optional[str], int] = {}
+    received: Dict[tuple, List[float]] = {}
+    counts = {"snapshot": 0, "delta": 0, "other": 0}
+    failures = 0
+    stop = asyncio.Event()
+
+    async def client(k: int):
+        nonlocal failures
+        group = groups[k % len(groups)]
+        t0 = time.perf_counter()
+        try:
+            async with websockets.connect(ws_url, open_timeout=30, max_queue=None) as ws:
+                connect_times.append(time.perf_counter() - t0)
+                joined[group] = joined.get(group, 0) + 1
+                await ws.send(json.dumps({"subscribe": [group] if group else []}))
+                while not stop.is_set():
+                    try:
+                        text = await asyncio.wait_for(ws.recv(), timeout=0.5)
+                    except asyncio.TimeoutError:
+                        continue
+                    now = time.perf_counter()
+                    msg = json.loads(text)
+                    kind = msg.get("type")
+                    counts[kind if kind in counts else "other"] += 1
+                    if "seq" in msg:
+                        received.setdefault((group, msg["seq"]), []).append(now)
+        except Exception:
+            failures += 1
+
+    tasks = [asyncio.create_task(client(k)) for k in range(clients)]
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    # only ticks every client of the group saw: late joiners' first snapshots are not a fan-out
+    skews = [max(ts) - min(ts) for (group, _), ts in received.items() if len(ts) == joined.get(group)]
+    connected = len(connect_times)
+    messages = sum(counts.values())
+    return {
+        "clients": clients,
+        "connected": connected,
+        "failures": failures,
+        "messages": counts,
+        "messages_per_client_per_s": round(messages / connected / duration, 3) if connected else None,
+        "connect": summarize(connect_times, duration, failures),
+        "fanout_skew": summarize(skews, duration, 0),
+    }
+
+def git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+async def run(args) -> dict:
+    queries = QueryCounter()
+    if not args.no_db:
+        await queries.open()
+    async with httpx.AsyncClient(base_url=args.url, timeout=60,
+                                 limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        coins = (await client.get("/api/config/info")).json()["coins"]
+        coins = [c for c in coins if c != "USDC"]
+        sym = coins[0]
+        scenarios = {
+            "badges": "/api/coins/badges",
+            "portfolio": "/api/portfolio/summary",
+            "status": "/api/status",
+            "price_history_raw_24h": f"/api/price_history?symbol={sym}&hours=24",
+            "price_history_ohlc_7d": f"/api/price_history?symbol={sym}&hours=168&max_points=600",
+            "price_history_columnar_24h": f"/api/price_history?symbol={sym}&hours=24&format=columnar",
+        }
+        http = {}
+        for name, path in scenarios.items():
+            if args.only and name not in args.only:
+                continue
+            # one untimed request so first-hit work (caches, rollup catch-up) isn't measured
+            await client.get(path)
+            http[name] = await http_scenario(client, path, args.concurrency, args.duration, queries)
+            print(f"{name:28s} p50 {http[name]['p50_ms']} ms  p99 {http[name]['p99_ms']} ms  "
+                  f"{http[name]['throughput_rps']} rps  q/req {http[name]['queries_per_request']}")
+    await queries.close()
+
+    ws = None
+    if args.ws_clients:
+        ws = await ws_scenario(args.url, args.ws_clients, args.duration, coins)
+        print(f"ws_live {ws['connected']}/{ws['clients']} connected, fan-out skew p99 {ws['fanout_skew']['p99_ms']} ms")
+
+    return {
+        "meta": {
+            "git": git_rev(),
+            "at": datetime.utcnow().isoformat() + "Z",
+            "url": args.url,
+            "python": platform.python_version(),
+            "duration_s": args.duration,
+            "concurrency": args.concurrency,
+            "coins": len(coins),
+        },
+        "http": http,
+        "ws_live": ws,
+    }
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'scenario':28s} {'metric':20s} {'old':>10s} {'new':>10s} {'change':>8s}")
+    for name, cur in new["http"].items():
+        prev = old["http"].get(name)
+        if prev is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "queries_per_request"):
+            a, b = prev.get(metric), cur.get(metric)
+            change = f"{(b - a) / a * 100:+.1f}%" if a and b is not None else ""
+            print(f"{name:28s} {metric:20s} {a!s:>10s} {b!s:>10s} {change:>8s}")
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--url", default="http://localhost:8080")
+    p.add_argument("--duration", type=float, default=15.0, help="seconds per scenario")
+    p.add_argument("--concurrency", type=int, default=16, help="concurrent HTTP workers")
+    p.add_argument("--ws-clients", type=int, default=200, help="concurrent /ws/live clients (0 to skip)")
+    p.add_argument("--only", nargs="*", help="HTTP scenarios to run (default: all)")
+    p.add_argument("--no-db", action="store_true", help="don't read pg_stat_statements")
+    p.add_argument("--out", help="write the results JSON here")
+    p.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="print the difference of two result files")
+    args = p.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    results = asyncio.run(run(args))
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Seed a local Postgres with a synthetic bot dataset for the benchmarks.
+
+    CONFIG_PATH=.env/config.json python -m bench.seed --coins 20 --months 3 --trades 50000 \\
+        --write-config bench/config.bench.json
+
+Writes `price_history` (a random walk per coin, one tick every --tick-seconds),
+`trades`, `balances`, `trading_state` and `bot_status` into the database from
+CONFIG_PATH, creating the tables if needed. With --write-config it also writes
+a copy of the config whose `coins` are the seeded ones, for the monitor under
+test. Refuses to touch a database that already has trades unless --truncate.
+"""
+import argparse, asyncio, copy, io, json, os, time
+from datetime import datetime, timedelta
+import asyncpg
+import numpy as np
+
+from app.config import get_config
+from app.db import engine, Base
+from app import models  # noqa: F401  (registers the tables on Base)
+
+BOT_TABLES = ["price_history", "trades", "balances", "trading_state", "bot_status"]
+DERIVED_TABLES = ["price_rollup_1m", "price_rollup_15m", "price_rollup_1h", "price_rollup_state"]
+
+def coin_names(n: int):
+    cfg = get_config()
+    names = [s.upper() for s, c in cfg.coins.items() if c.enabled and s.upper() != "USDC"][:n]
+    return names + [f"BX{i:03d}" for i in range(n - len(names))]
+
+def random_walk(rng, n: int, start: float, step_vol: float) -> np.ndarray:
+    return start * np.exp(np.cumsum(rng.normal(0.0, step_vol, n)))
+
+def _csv(rows) -> bytes:
+    buf = io.StringIO()
+    for r in rows:
+        buf.write(",".join("" if v is None else str(v) for v in r))
+        buf.write("\n")
+    return buf.getvalue().encode()
+
+async def _copy(conn, table: str, columns, data: bytes):
+    await conn.copy_to_table(table, source=io.BytesIO(data), columns=columns, format="csv")
+
+async def seed(args) -> dict:
+    cfg = get_config()
+    db = cfg.database
+    rng = np.random.default_rng(args.seed)
+    coins = coin_names(args.coins)
+    end = datetime.utcnow().replace(microsecond=0)
+    start = end - timedelta(days=30 * args.months)
+    ticks = int((end - start).total_seconds() // args.tick_seconds)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    conn = await asyncpg.connect(host=db.host, port=db.port, user=db.user, password=db.password, database=db.name)
+    t0 = time.perf_counter()
+    try:
+        if args.truncate:
+            existing = [t for t in BOT_TABLES + DERIVED_TABLES
+                        if await conn.fetchval("SELECT to_regclass($1)", t) is not None]
+            await conn.execute(f"TRUNCATE {', '.join(existing)}")
+        elif await conn.fetchval("SELECT EXISTS (SELECT 1 FROM trades)"):
+            raise SystemExit(f"{db.host}/{db.name} already has trades; pass --truncate to replace them")
+
+        # price_history: one random walk per coin, written a day at a time
+        last_prices, walks = {}, {}
+        per_day = max(1, 86400 // args.tick_seconds)
+        for coin in coins:
+            walk = random_walk(rng, ticks, float(rng.uniform(0.1, 5000)), 0.0015)
+            walks[coin] = walk
+            for lo in range(0, ticks, per_day):
+                hi = min(ticks, lo + per_day)
+                rows = ((coin, (start + timedelta(seconds=i * args.tick_seconds)).isoformat(sep=" "), f"{walk[i]:.8f}")
+                        for i in range(lo, hi))
+                await _copy(conn, "price_history", ["symbol", "timestamp", "price"], _csv(rows))
+            last_prices[coin] = float(walk[-1])
+
+        # trades: random BUY/SELL at the walk price of their tick
+        picks = rng.integers(0, len(coins), args.trades)
+        at = np.sort(rng.integers(0, ticks, args.trades))
+        sides = np.where(rng.random(args.trades) < 0.6, "BUY", "SELL")
+        trade_rows = []
+        for i in range(args.trades):
+            coin = coins[picks[i]]
+            price = walks[coin][at[i]]
+            amount = float(rng.uniform(10, 500)) / price
+            ts = start + timedelta(seconds=int(at[i]) * args.tick_seconds)
+            trade_rows.append((i + 1, coin, sides[i], f"{amount:.8f}", f"{price:.8f}", ts.isoformat(sep=" ")))
+        await _copy(conn, "trades", ["id", "symbol", "side", "amount", "price", "timestamp"], _csv(trade_rows))
+        if await conn.fetchval("SELECT pg_get_serial_sequence('trades', 'id')"):
+            await conn.execute("SELECT setval(pg_get_serial_sequence('trades', 'id'), $1)", max(args.trades, 1))
+
+        balance_rows = [("USDC", f"{rng.uniform(100, 10000):.2f}")] + [
+            (coin, f"{rng.uniform(0, 1000) / last_prices[coin]:.8f}" if rng.random() < 0.7 else "0") for coin in coins
+        ]
+        await _copy(conn, "balances", ["currency", "available_balance"], _csv(balance_rows))
+        state_rows = [(coin, f"{walks[coin][0]:.8f}", int((picks == k).sum()), f"{rng.normal(0, 50):.8f}")
+                      for k, coin in enumerate(coins)]
+        await _copy(conn, "trading_state", ["symbol", "initial_price", "total_trades", "total_profit"], _csv(state_rows))
+        await conn.execute("INSERT INTO bot_status (active, last_trade) VALUES (true, 'seeded')")
+        await conn.execute("ANALYZE")
+    finally:
+        await conn.close()
+
+    return {
+        "coins": coins,
+        "months": args.months,
+        "tick_seconds": args.tick_seconds,
+        "price_rows": ticks * len(coins),
+        "trades": args.trades,
+        "seconds": round(time.perf_counter() - t0, 1),
+    }
+
+def write_config(path: str, coins):
+    """Copy of CONFIG_PATH with `coins` replaced by the seeded ones (settings cloned from the first coin)."""
+    with open(os.getenv("CONFIG_PATH", "/config/config.json"), encoding="utf-8") as f:
+        data = json.load(f)
+    template = next(iter(data["coins"].values()))
+    data["coins"] = {coin: copy.deepcopy(data["coins"].get(coin, template)) for coin in coins}
+    for c in data["coins"].values():
+        c["enabled"] = True
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--coins", type=int, default=10, help="number of coins (configured ones first)")
+    p.add_argument("--months", type=int, default=1, help="months of price_history")
+    p.add_argument("--tick-seconds", type=int, default=10, help="seconds between price ticks per coin")
+    p.add_argument("--trades", type=int, default=10000, help="number of trades")
+    p.add_argument("--seed", type=int, default=0, help="RNG seed")
+    p.add_argument("--truncate", action="store_true", help="empty the bot and rollup tables first")
+    p.add_argument("--write-config", metavar="PATH", help="write a config listing the seeded coins")
+    args = p.parse_args()
+
+    summary = asyncio.run(seed(args))
+    if args.write_config:
+        write_config(args.write_config, summary["coins"])
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()